@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#
+# Bytes on disk and store/get latency of the cache value codecs on
+# FileCache and LogFileCache, for cached timelines both as parsed
+# models (the default) and as decoded JSON.
+#
+# usage: python benchmarks/cache_codecs.py [options]
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tweepy.cache import FileCache, LogFileCache, PickleCodec, MarshalCodec, \
+        ZlibCodec
+from tweepy.models import Status
+
+import fixtures
+
+codecs = [
+    ('pickle protocol 0', PickleCodec(0)),
+    ('pickle highest', PickleCodec()),
+    ('marshal', MarshalCodec()),
+    ('zlib(pickle)', ZlibCodec(PickleCodec())),
+    ('zlib(marshal)', ZlibCodec(MarshalCodec())),
+]
+
+
+def disk_usage(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def run(cache_class, codec, values):
+    """Return (bytes per entry, store ms, get ms)"""
+    path = tempfile.mkdtemp()
+    try:
+        cache = cache_class(os.path.join(path, 'cache'), timeout=0, codec=codec)
+        keys = ['/statuses/home_timeline.json?page=%d' % i
+                for i in range(len(values))]
+        began = time.time()
+        for key, value in zip(keys, values):
+            cache.store(key, value)
+        store = time.time() - began
+        began = time.time()
+        for key in keys:
+            cache.get(key)
+        get = time.time() - began
+        if hasattr(cache, 'close'):
+            cache.close()
+        size = disk_usage(path)
+    finally:
+        shutil.rmtree(path)
+    n = float(len(values))
+    return size / n, store / n * 1000, get / n * 1000
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--entries', type='int', default=50,
+                      help='timelines stored per run')
+    parser.add_option('--statuses', type='int', default=200,
+                      help='statuses per timeline')
+    options, args = parser.parse_args()
+
+    page = fixtures.timeline(options.statuses)
+    kinds = [
+        ('decoded JSON', [page] * options.entries),
+        ('parsed models', [Status.parse_list(None, page)] * options.entries),
+    ]
+    for cache_class in (FileCache, LogFileCache):
+        for kind, values in kinds:
+            print '%s, %s (%d statuses per entry)' % (
+                cache_class.__name__, kind, options.statuses)
+            print '  %-18s %12s %10s %10s' % ('codec', 'bytes/entry',
+                                               'store ms', 'get ms')
+            for name, codec in codecs:
+                size, store, get = run(cache_class, codec, values)
+                print '  %-18s %12.0f %10.3f %10.3f' % (name, size, store, get)
+            print
+
+
+if __name__ == '__main__':
+    main()
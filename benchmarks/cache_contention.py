@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+#
+# Throughput of MemoryCache and ShardedMemoryCache under 1 to 32
+# threads doing a mix of get and store calls on shared keys.
+#
+# usage: python benchmarks/cache_contention.py [options]
+
+import os
+import sys
+import time
+import random
+import threading
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tweepy.cache import MemoryCache, ShardedMemoryCache
+
+
+def worker(cache, keys, ops, store_ratio, seed, start):
+    rand = random.Random(seed)
+    picks = [rand.choice(keys) for i in range(ops)]
+    stores = [rand.random() < store_ratio for i in range(ops)]
+    start.wait()
+    for i in xrange(ops):
+        if stores[i]:
+            cache.store(picks[i], i)
+        else:
+            cache.get(picks[i])
+
+
+def run(cache, threads, ops, keys, store_ratio):
+    """Return get/store calls per second across all threads"""
+    for key in keys:
+        cache.store(key, 0)
+    start = threading.Event()
+    workers = [threading.Thread(target=worker,
+                                args=(cache, keys, ops, store_ratio, n, start))
+               for n in range(threads)]
+    for w in workers:
+        w.start()
+    began = time.time()
+    start.set()
+    for w in workers:
+        w.join()
+    return threads * ops / (time.time() - began)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--ops', type='int', default=50000,
+                      help='calls made by each thread')
+    parser.add_option('--keys', type='int', default=10000,
+                      help='number of distinct keys')
+    parser.add_option('--stores', type='float', default=0.1,
+                      help='fraction of calls that are stores')
+    parser.add_option('--shards', type='int', default=16)
+    options, args = parser.parse_args()
+
+    keys = ['key%d' % i for i in range(options.keys)]
+    print 'threads  MemoryCache  ShardedMemoryCache  speedup   (calls/s)'
+    for threads in (1, 2, 4, 8, 16, 32):
+        single = run(MemoryCache(), threads, options.ops, keys, options.stores)
+        sharded = run(ShardedMemoryCache(shards=options.shards), threads,
+                      options.ops, keys, options.stores)
+        print '%7d  %11.0f  %18.0f  %6.2fx' % (threads, single, sharded,
+                                              sharded / single)
+
+
+if __name__ == '__main__':
+    main()
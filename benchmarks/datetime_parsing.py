@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# Time to parse Twitter timestamps with the table-driven parsers in
+# tweepy.utils, compared with the setlocale + strptime functions they
+# replaced, on all-distinct and on repeating timestamps.
+#
+# usage: python benchmarks/datetime_parsing.py [options]
+
+import os
+import sys
+import time
+import locale
+from datetime import datetime, timedelta
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tweepy import utils
+
+
+def strptime_parse_datetime(string):
+    # the previous parse_datetime
+    locale.setlocale(locale.LC_TIME, 'C')
+    date = datetime(*(time.strptime(string, '%a %b %d %H:%M:%S +0000 %Y')[0:6]))
+    locale.setlocale(locale.LC_TIME, '')
+    return date
+
+
+def strptime_parse_search_datetime(string):
+    # the previous parse_search_datetime
+    locale.setlocale(locale.LC_TIME, 'C')
+    date = datetime(*(time.strptime(string, '%a, %d %b %Y %H:%M:%S +0000')[0:6]))
+    locale.setlocale(locale.LC_TIME, '')
+    return date
+
+
+def timestamps(count, distinct, format):
+    """count strings in format cycling through distinct instants"""
+    start = datetime(2010, 8, 27, 13, 8, 45)
+    days = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+    months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+              'Oct', 'Nov', 'Dec')
+    strings = []
+    for i in range(distinct):
+        d = start - timedelta(seconds=i * 37)
+        strings.append(format % {
+            'a': days[d.weekday()], 'b': months[d.month - 1], 'd': d.day,
+            'Y': d.year, 'H': d.hour, 'M': d.minute, 'S': d.second})
+    return [strings[i % distinct] for i in range(count)]
+
+
+def timed(function, strings, batch=False):
+    """Return microseconds per timestamp, starting from an empty memo"""
+    utils._datetime_memo.clear()
+    began = time.time()
+    if batch:
+        function(strings)
+    else:
+        for string in strings:
+            function(string)
+    return (time.time() - began) / len(strings) * 1e6
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--count', type='int', default=100000,
+                      help='timestamps parsed per run')
+    parser.add_option('--distinct', type='int', default=500,
+                      help='distinct timestamps in the repeating run')
+    options, args = parser.parse_args()
+
+    formats = [
+        ('status', '%(a)s %(b)s %(d)02d %(H)02d:%(M)02d:%(S)02d +0000 %(Y)d',
+         strptime_parse_datetime, utils.parse_datetime, utils.parse_datetimes),
+        ('search', '%(a)s, %(d)02d %(b)s %(Y)d %(H)02d:%(M)02d:%(S)02d +0000',
+         strptime_parse_search_datetime, utils.parse_search_datetime,
+         utils.parse_search_datetimes),
+    ]
+    print 'microseconds per timestamp, %d timestamps per run' % options.count
+    print '%-8s %-10s %10s %10s %10s %8s' % ('format', 'strings', 'strptime',
+                                             'single', 'batch', 'speedup')
+    for name, format, old, single, batch in formats:
+        for label, distinct in (('distinct', options.count),
+                                ('repeating', options.distinct)):
+            strings = timestamps(options.count, distinct, format)
+            assert old(strings[0]) == single(strings[0])
+            before = timed(old, strings)
+            after = timed(single, strings)
+            batched = timed(batch, strings, True)
+            print '%-8s %-10s %10.2f %10.2f %10.2f %7.1fx' % (
+                name, label, before, after, batched, before / after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# Payloads shaped like Twitter API v1 responses, for the benchmarks.
+# The field sets and typical lengths follow real user, status and
+# search objects; the values are generated so no account data is kept
+# in the tree.
+
+import random
+
+_rand = random.Random(42)
+
+_clients = [
+    'web',
+    '<a href="http://www.tweetdeck.com" rel="nofollow">TweetDeck</a>',
+    '<a href="http://twitter.com/#!/download/iphone" rel="nofollow">Twitter for iPhone</a>',
+    '<a href="http://www.echofon.com/" rel="nofollow">Echofon</a>',
+    '<a href="http://twitterfeed.com" rel="nofollow">twitterfeed</a>',
+]
+
+_words = ('the a of to and in is it you that was for on are with as '
+          'twitter today just new now good love time day great work '
+          'lol back http://bit.ly/abc123 @someone #python').split()
+
+
+def _text(length):
+    words = []
+    while sum([len(w) + 1 for w in words]) < length:
+        words.append(_rand.choice(_words))
+    return ' '.join(words)[:140]
+
+
+def _date(i):
+    return 'Wed Aug %02d %02d:%02d:%02d +0000 2010' % (
+        1 + i % 28, i % 24, i % 60, (i * 7) % 60)
+
+
+def status(i, user=None):
+    s = {
+        'id': 20000000000 + i,
+        'id_str': str(20000000000 + i),
+        'text': _text(90),
+        'source': _rand.choice(_clients),
+        'truncated': False,
+        'created_at': _date(i),
+        'in_reply_to_status_id': None,
+        'in_reply_to_status_id_str': None,
+        'in_reply_to_user_id': None,
+        'in_reply_to_user_id_str': None,
+        'in_reply_to_screen_name': None,
+        'favorited': False,
+        'retweeted': False,
+        'retweet_count': i % 5,
+        'geo': None,
+        'coordinates': None,
+        'place': None,
+        'contributors': None,
+    }
+    if user is not None:
+        s['user'] = user
+    return s
+
+
+def user(i, with_status=True):
+    u = {
+        'id': 1000000 + i,
+        'id_str': str(1000000 + i),
+        'name': 'User Number %d' % i,
+        'screen_name': 'user%d' % i,
+        'location': 'Taipei, Taiwan',
+        'description': _text(100),
+        'url': 'http://example.com/~user%d' % i,
+        'protected': False,
+        'followers_count': 100 + i * 3,
+        'friends_count': 50 + i,
+        'listed_count': i % 17,
+        'favourites_count': i % 40,
+        'statuses_count': 1000 + i * 11,
+        'created_at': _date(i * 13),
+        'utc_offset': 28800,
+        'time_zone': 'Taipei',
+        'geo_enabled': False,
+        'verified': False,
+        'lang': 'en',
+        'contributors_enabled': False,
+        'profile_background_color': 'C0DEED',
+        'profile_background_image_url': 'http://a1.twimg.com/images/themes/theme1/bg.png',
+        'profile_background_tile': False,
+        'profile_image_url': 'http://a1.twimg.com/profile_images/%d/avatar_normal.png' % i,
+        'profile_link_color': '0084B4',
+        'profile_sidebar_border_color': 'C0DEED',
+        'profile_sidebar_fill_color': 'DDEEF6',
+        'profile_text_color': '333333',
+        'profile_use_background_image': True,
+        'show_all_inline_media': False,
+        'following': None,
+        'follow_request_sent': False,
+        'notifications': None,
+    }
+    if with_status:
+        u['status'] = status(i)
+    return u
+
+
+def timeline(n=200, authors=20):
+    """A home timeline of n statuses written by a few authors"""
+    users = [user(i, with_status=False) for i in range(authors)]
+    return [status(i, users[i % authors]) for i in range(n)]
+
+
+def friends_page(n=100):
+    """One cursored page of statuses/friends"""
+    return {'users': [user(i) for i in range(n)],
+            'previous_cursor': 0, 'next_cursor': 1345678901234567890}
+
+
+def search_page(n=100):
+    """One page of search results, as returned by search.twitter.com"""
+    results = []
+    for i in range(n):
+        results.append({
+            'id': 20000000000 + i,
+            'text': _text(90),
+            'from_user': 'user%d' % (i % 30),
+            'from_user_id': 1000000 + i % 30,
+            'to_user_id': None,
+            'iso_language_code': 'en',
+            'profile_image_url': 'http://a1.twimg.com/profile_images/%d/a.png' % i,
+            'source': _rand.choice(_clients).replace('&', '&amp;').replace(
+                '<', '&lt;').replace('>', '&gt;').replace('"', '&quot;'),
+            'created_at': 'Wed, %02d Aug 2010 %02d:%02d:%02d +0000' % (
+                1 + i % 28, i % 24, i % 60, (i * 7) % 60),
+            'metadata': {'result_type': 'recent'},
+        })
+    return {'results': results, 'max_id': 20000000000 + n, 'since_id': 0,
+            'refresh_url': '?since_id=%d&q=python' % (20000000000 + n),
+            'next_page': '?page=2&max_id=%d&q=python' % (20000000000 + n),
+            'results_per_page': n, 'page': 1, 'completed_in': 0.04,
+            'query': 'python'}
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+#
+# Decode throughput of each JSON backend in utils.json_backends that
+# is importable here, on timeline, friends and search payloads.
+#
+# usage: python benchmarks/json_backends.py [options]
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tweepy.utils import json_backends
+
+import fixtures
+
+
+def available_backends():
+    backends = []
+    for name in json_backends:
+        try:
+            backends.append((name, __import__(name, {}, {}, ['loads'])))
+        except ImportError:
+            pass
+    return backends
+
+
+def throughput(backend, payload, seconds):
+    """Return megabytes of payload decoded per second"""
+    loads = backend.loads
+    decoded = 0
+    began = time.time()
+    while True:
+        loads(payload)
+        decoded += 1
+        elapsed = time.time() - began
+        if elapsed >= seconds:
+            return decoded * len(payload) / elapsed / 1e6
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--seconds', type='float', default=1.0,
+                      help='time spent decoding each payload')
+    options, args = parser.parse_args()
+
+    backends = available_backends()
+    encoder = backends[-1][1]
+    payloads = [
+        ('home timeline', encoder.dumps(fixtures.timeline(200))),
+        ('friends page', encoder.dumps(fixtures.friends_page(100))),
+        ('search page', encoder.dumps(fixtures.search_page(100))),
+    ]
+    print 'MB decoded per second; not installed: %s' % (', '.join(
+        [name for name in json_backends
+         if name not in dict(backends)]) or 'none')
+    print '%-24s' % 'backend' + ''.join(['%16s' % name for name, p in payloads])
+    for name, backend in backends:
+        print '%-24s' % name + ''.join(['%16.1f' % throughput(backend, p, options.seconds)
+                                        for n, p in payloads])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Bytes per parsed User and Status with slotted models, compared with
+# plain objects holding every field in an instance dict as models did
+# before they declared __slots__. Field values are the same objects
+# either way, so only the instances and their dicts are counted.
+#
+# usage: python benchmarks/model_memory.py [options]
+
+import os
+import sys
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tweepy.models import Model, Status, User, _slot_names
+from tweepy.utils import parse_datetime
+
+import fixtures
+
+
+class DictModel(object):
+    """A model as parsed before __slots__: every field in __dict__"""
+
+
+def parse_dict_user(json):
+    user = DictModel()
+    for k, v in json.items():
+        if k == 'created_at':
+            v = parse_datetime(v)
+        elif k == 'status':
+            v = parse_dict_status(v)
+        setattr(user, k, v)
+    return user
+
+
+def parse_dict_status(json):
+    status = DictModel()
+    for k, v in json.items():
+        if k == 'user':
+            # stored under both names
+            v = parse_dict_user(v)
+            setattr(status, 'author', v)
+        elif k == 'created_at':
+            v = parse_datetime(v)
+        setattr(status, k, v)
+    return status
+
+
+def model_size(obj, seen):
+    """Size of obj, its instance dict and the models nested in it"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, Model):
+        fields = obj.__getstate__()
+        # the overflow dict only exists once an unknown key was set,
+        # reading __dict__ would create it
+        slots = _slot_names(type(obj))
+        if [name for name in fields if name not in slots]:
+            size += sys.getsizeof(obj.__dict__)
+    else:
+        fields = obj.__dict__
+        size += sys.getsizeof(fields)
+    for value in fields.values():
+        if isinstance(value, (Model, DictModel)):
+            size += model_size(value, seen)
+    return size
+
+
+def average(objects):
+    seen = set()
+    return sum([model_size(obj, seen) for obj in objects]) / float(len(objects))
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--count', type='int', default=1000,
+                      help='users and statuses to parse')
+    options, args = parser.parse_args()
+
+    count = options.count
+    rows = [
+        ('User', [fixtures.user(i, False) for i in range(count)],
+         parse_dict_user, User.parse),
+        ('Status', [fixtures.status(i) for i in range(count)],
+         parse_dict_status, Status.parse),
+        ('friends page user', fixtures.friends_page(count)['users'],
+         parse_dict_user, User.parse),
+    ]
+    print '%-18s %14s %14s %8s' % ('', 'dict bytes', 'slots bytes', 'saved')
+    for name, data, parse_dict, parse_slots in rows:
+        before = average([parse_dict(json) for json in data])
+        after = average([parse_slots(None, json) for json in data])
+        print '%-18s %14.0f %14.0f %7.0f%%' % (name, before, after,
+                                               100 * (1 - after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+#
+# Time to turn parsed users into JSON-ready dicts and JSON text with
+# Model.to_dict/ResultSet.iter_json, compared with building the dicts
+# by hand as main.py's EventsHandler did.
+#
+# usage: python benchmarks/model_serialization.py [options]
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tweepy.models import User
+from tweepy.utils import json_dumps
+
+import fixtures
+
+event_fields = ['created_at', 'name', 'profile_image_url', 'screen_name',
+                'description']
+
+
+def manual_dicts(users):
+    events = []
+    for user in users:
+        events.append({
+            'start': user.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'title': user.name,
+            'image': user.profile_image_url,
+            'link': "http://twitter.com/" + user.screen_name,
+            'description': user.description,
+            'caption': user.screen_name,
+            })
+    return events
+
+
+def field_dicts(users):
+    return list(users.to_dicts(event_fields))
+
+
+def full_dicts(users):
+    return list(users.to_dicts())
+
+
+def manual_json(users):
+    return json_dumps(manual_dicts(users))
+
+
+def field_json(users):
+    return ''.join(users.iter_json(event_fields))
+
+
+def best_time(function, users, repeat):
+    """Return the fastest of repeat runs, in microseconds per user"""
+    best = None
+    for i in range(repeat):
+        began = time.time()
+        function(users)
+        elapsed = time.time() - began
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(users) * 1e6
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--users', type='int', default=1000)
+    parser.add_option('--repeat', type='int', default=5)
+    options, args = parser.parse_args()
+
+    users = User.parse_list(None, fixtures.friends_page(options.users))
+    rows = [
+        ('hand-built event dicts', manual_dicts),
+        ('to_dicts(5 fields)', field_dicts),
+        ('to_dicts() all fields', full_dicts),
+        ('json_dumps(hand-built)', manual_json),
+        ('iter_json(5 fields)', field_json),
+    ]
+    print '%-26s %14s' % ('', 'us per user')
+    for name, function in rows:
+        print '%-26s %14.2f' % (name, best_time(function, users, options.repeat))
+
+
+if __name__ == '__main__':
+    main()
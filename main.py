@@ -31,13 +31,26 @@ from google.appengine.ext import webapp
 from google.appengine.ext.webapp import util
 from google.appengine.ext.webapp import template
 from google.appengine.runtime import DeadlineExceededError
-from django.utils import simplejson as json
 import tweepy
 from tweepy import Cursor
+from tweepy.parsers import JSONParser
+from tweepy.utils import json_dumps, parse_datetime, format_datetime
 from configs import CONSUMER_KEY, CONSUMER_SECRET, CALLBACK
 from utils import Cookies
 
 
+def user_event(user):
+    """Map a user dict, as decoded from the API, to a timeline event"""
+    return {
+        'start': format_datetime(parse_datetime(user['created_at'])),
+        'title': user['name'],
+        'image': user['profile_image_url'],
+        'link': "http://twitter.com/" + user['screen_name'],
+        'description': user['description'],
+        'caption': user['screen_name'],
+        }
+
+
 class MainHandler(webapp.RequestHandler):
     def get(self):
         cookies = Cookies(self)
@@ -208,7 +221,7 @@ class EventsHandler(webapp.RequestHandler):
 
         # Add self.
         event = {
-            'start': me.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'start': format_datetime(me.created_at),
             'title': me.name,
             'image': me.profile_image_url,
             'link': "http://twitter.com/" + me.screen_name,
@@ -218,18 +231,11 @@ class EventsHandler(webapp.RequestHandler):
             }
         events.append(event)
 
-        # Add others.
+        # Add others, straight from the decoded JSON.
         try:
-            for user in Cursor(api.friends).items():
-                event = {
-                    'start': user.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
-                    'title': user.name,
-                    'image': user.profile_image_url,
-                    'link': "http://twitter.com/" + user.screen_name,
-                    'description': user.description,
-                    'caption': user.screen_name,
-                    }
-                events.append(event)
+            for page in Cursor(api.friends, parser=JSONParser()).pages():
+                for user in page['users']:
+                    events.append(user_event(user))
         except tweepy.TweepError, e:
             self.error(503)
             return
@@ -238,7 +244,7 @@ class EventsHandler(webapp.RequestHandler):
             logging.warning("%s has %d entries, just retrieved %d" % (me.screen_name, me.friends_count, len(events)))
             pass
 
-        self.response.out.write(json.dumps(result))
+        self.response.out.write(json_dumps(result))
 
 
 def main():
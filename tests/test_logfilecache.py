@@ -0,0 +1,55 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tweepy.cache import LogFileCache
+
+
+class LogFileCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def reopen(self, cache):
+        cache.close()
+        return LogFileCache(self.cache_dir, segment_size=60)
+
+    def testCompactAfterGet(self):
+        # the get maps the segment before k4 is appended to it
+        cache = LogFileCache(self.cache_dir, segment_size=60)
+        cache.store('k3', 'a')
+        self.assertEqual(cache.get('k3'), 'a')
+        cache.store('k4', 'b')
+        cache.store('k3', 'c')
+        cache.store('k3', 'd')
+        cache.cleanup()
+        self.assertEqual(cache.get('k4'), 'b')
+        self.assertEqual(cache.get('k3'), 'd')
+        cache = self.reopen(cache)
+        self.assertEqual(cache.get('k4'), 'b')
+        self.assertEqual(cache.get('k3'), 'd')
+        cache.close()
+
+    def testDeletedKeyStaysDeleted(self):
+        cache = LogFileCache(self.cache_dir, segment_size=200)
+        cache.store('big', 'x' * 300)
+        cache.store('key', 'A')
+        cache.store('key', 'B' * 300)
+        cache.store('z', 1)
+        self.assertEqual(cache.get('key', 1e-9), None)
+        cache.cleanup()
+        cache.close()
+        cache = LogFileCache(self.cache_dir, segment_size=200)
+        self.assertEqual(cache.get('key'), None)
+        self.assertEqual(cache.get('z'), 1)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,10 +9,13 @@ __version__ = '1.7.1'
 __author__ = 'Joshua Roesslein'
 __license__ = 'MIT'
 
-from tweepy.models import Status, User, DirectMessage, Friendship, SavedSearch, SearchResult, ModelFactory
+from tweepy.models import Status, User, DirectMessage, Friendship, SavedSearch, SearchResult, ModelFactory, \
+        LazyModelFactory, ColumnarModelFactory
 from tweepy.error import TweepError
 from tweepy.api import API
-from tweepy.cache import Cache, MemoryCache, FileCache
+from tweepy.cache import Cache, MemoryCache, ShardedMemoryCache, TieredCache, \
+        MemcacheCache, FileCache, LogFileCache, SQLiteCache, RefreshAhead, \
+        PickleCodec, MarshalCodec, ZlibCodec
 from tweepy.auth import BasicAuthHandler, OAuthHandler
 from tweepy.streaming import Stream, StreamListener
 from tweepy.cursor import Cursor
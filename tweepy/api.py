@@ -5,26 +5,48 @@
 import os
 import mimetypes
 
-from tweepy.binder import bind_api
+from tweepy.binder import bind_api, invalidation_patterns
 from tweepy.error import TweepError
 from tweepy.parsers import ModelParser
 from tweepy.utils import list_to_csv
 
+# The list mutations bind their methods on each call, so the patterns
+# they invalidate are registered here, before anything is cached.
+list_invalidates = ['/{user}/lists*', '/{owner}/lists/{slug}*']
+list_member_invalidates = ['/{owner}/{slug}/members.json', '/*/*/members/*']
+invalidation_patterns.update(list_invalidates)
+invalidation_patterns.update(list_member_invalidates)
+
 
 class API(object):
-    """Twitter API"""
+    """Twitter API
+
+    Cached GETs live for their method's cache_timeout: the bind_api
+    setting, overridden per path by cache_policy={path: seconds} and
+    per call by a cache_timeout keyword. None uses the cache's own
+    timeout and 0 disables caching. The cache still purges entries by
+    its own timeout (in cleanup, its reaper, and as the memcached
+    expiry), so it must be at least the longest TTL used here or that
+    TTL is cut short.
+    """
 
     def __init__(self, auth_handler=None,
             host='api.twitter.com', search_host='search.twitter.com',
              cache=None, secure=False, api_root='/1', search_root='',
             retry_count=0, retry_delay=0, retry_errors=None,
-            parser=None):
+            parser=None, cache_raw=False, cache_policy=None,
+            negative_cache_timeout=0, stale_on_error=False, refresher=None):
         self.auth = auth_handler
         self.host = host
         self.search_host = search_host
         self.api_root = api_root
         self.search_root = search_root
         self.cache = cache
+        self.cache_raw = cache_raw
+        self.cache_policy = cache_policy or {}
+        self.negative_cache_timeout = negative_cache_timeout
+        self.stale_on_error = stale_on_error
+        self.refresher = refresher
         self.secure = secure
         self.retry_count = retry_count
         self.retry_delay = retry_delay
@@ -35,7 +57,8 @@ class API(object):
     public_timeline = bind_api(
         path = '/statuses/public_timeline.json',
         payload_type = 'status', payload_list = True,
-        allowed_param = []
+        allowed_param = [],
+        cache_timeout = 0
     )
 
     """ statuses/home_timeline """
@@ -123,7 +146,8 @@ class API(object):
         method = 'POST',
         payload_type = 'status',
         allowed_param = ['status', 'in_reply_to_status_id', 'lat', 'long', 'source', 'place_id'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/statuses/*timeline.json', '/account/verify_credentials.json', '/users/show.json']
     )
 
     """ statuses/destroy """
@@ -132,7 +156,8 @@ class API(object):
         method = 'DELETE',
         payload_type = 'status',
         allowed_param = ['id'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/statuses/*timeline.json', '/account/verify_credentials.json', '/users/show.json']
     )
 
     """ statuses/retweet """
@@ -141,7 +166,9 @@ class API(object):
         method = 'POST',
         payload_type = 'status',
         allowed_param = ['id'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/statuses/*timeline.json', '/statuses/retweet*',
+                       '/account/verify_credentials.json', '/users/show.json']
     )
 
     """ statuses/retweets """
@@ -156,7 +183,8 @@ class API(object):
     get_user = bind_api(
         path = '/users/show.json',
         payload_type = 'user',
-        allowed_param = ['id', 'user_id', 'screen_name']
+        allowed_param = ['id', 'user_id', 'screen_name'],
+        cache_timeout = 3600
     )
 
     """ Perform bulk look up of users from user ID or screenname """
@@ -218,7 +246,8 @@ class API(object):
         method = 'POST',
         payload_type = 'direct_message',
         allowed_param = ['user', 'screen_name', 'user_id', 'text'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/direct_messages/sent.json']
     )
 
     """ direct_messages/destroy """
@@ -227,7 +256,8 @@ class API(object):
         method = 'DELETE',
         payload_type = 'direct_message',
         allowed_param = ['id'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/direct_messages*']
     )
 
     """ friendships/create """
@@ -236,7 +266,9 @@ class API(object):
         method = 'POST',
         payload_type = 'user',
         allowed_param = ['id', 'user_id', 'screen_name', 'follow'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/statuses/friends.json', '/friends/ids.json', '/friendships/*',
+                       '/statuses/*timeline.json', '/account/verify_credentials.json', '/users/show.json']
     )
 
     """ friendships/destroy """
@@ -245,7 +277,9 @@ class API(object):
         method = 'DELETE',
         payload_type = 'user',
         allowed_param = ['id', 'user_id', 'screen_name'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/statuses/friends.json', '/friends/ids.json', '/friendships/*',
+                       '/statuses/*timeline.json', '/account/verify_credentials.json', '/users/show.json']
     )
 
     """ friendships/exists """
@@ -314,7 +348,8 @@ class API(object):
         method = 'POST',
         allowed_param = ['device'],
         payload_type = 'user',
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/account/verify_credentials.json', '/users/show.json']
     )
 
     """ account/update_profile_colors """
@@ -325,7 +360,8 @@ class API(object):
         allowed_param = ['profile_background_color', 'profile_text_color',
                           'profile_link_color', 'profile_sidebar_fill_color',
                           'profile_sidebar_border_color'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/account/verify_credentials.json', '/users/show.json']
     )
 
     """ account/update_profile_image """
@@ -335,7 +371,8 @@ class API(object):
             path = '/account/update_profile_image.json',
             method = 'POST',
             payload_type = 'user',
-            require_auth = True
+            require_auth = True,
+            invalidates = ['/account/verify_credentials.json', '/users/show.json']
         )(self, post_data=post_data, headers=headers)
 
     """ account/update_profile_background_image """
@@ -346,7 +383,8 @@ class API(object):
             method = 'POST',
             payload_type = 'user',
             allowed_param = ['tile'],
-            require_auth = True
+            require_auth = True,
+            invalidates = ['/account/verify_credentials.json', '/users/show.json']
         )(self, post_data=post_data, headers=headers)
 
     """ account/update_profile """
@@ -355,7 +393,8 @@ class API(object):
         method = 'POST',
         payload_type = 'user',
         allowed_param = ['name', 'url', 'location', 'description'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/account/verify_credentials.json', '/users/show.json']
     )
 
     """ favorites """
@@ -371,7 +410,8 @@ class API(object):
         method = 'POST',
         payload_type = 'status',
         allowed_param = ['id'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/favorites.json']
     )
 
     """ favorites/destroy """
@@ -380,7 +420,8 @@ class API(object):
         method = 'DELETE',
         payload_type = 'status',
         allowed_param = ['id'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/favorites.json']
     )
 
     """ notifications/follow """
@@ -407,7 +448,9 @@ class API(object):
         method = 'POST',
         payload_type = 'user',
         allowed_param = ['id', 'user_id', 'screen_name'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/blocks/*', '/statuses/friends.json', '/friends/ids.json',
+                       '/friendships/*']
     )
 
     """ blocks/destroy """
@@ -416,7 +459,9 @@ class API(object):
         method = 'DELETE',
         payload_type = 'user',
         allowed_param = ['id', 'user_id', 'screen_name'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/blocks/*', '/statuses/friends.json', '/friends/ids.json',
+                       '/friendships/*']
     )
 
     """ blocks/exists """
@@ -452,7 +497,9 @@ class API(object):
         method = 'POST',
         payload_type = 'user',
         allowed_param = ['id', 'user_id', 'screen_name'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/blocks/*', '/statuses/friends.json', '/friends/ids.json',
+                       '/friendships/*']
     )
 
     """ saved_searches """
@@ -476,7 +523,8 @@ class API(object):
         method = 'POST',
         payload_type = 'saved_search',
         allowed_param = ['query'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/saved_searches*']
     )
 
     """ saved_searches/destroy """
@@ -485,7 +533,8 @@ class API(object):
         method = 'DELETE',
         payload_type = 'saved_search',
         allowed_param = ['id'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/saved_searches*']
     )
 
     """ help/test """
@@ -504,7 +553,8 @@ class API(object):
             method = 'POST',
             payload_type = 'list',
             allowed_param = ['name', 'mode', 'description'],
-            require_auth = True
+            require_auth = True,
+            invalidates = list_invalidates
         )(self, *args, **kargs)
 
     def destroy_list(self, slug):
@@ -512,7 +562,8 @@ class API(object):
             path = '/%s/lists/%s.json' % (self.auth.get_username(), slug),
             method = 'DELETE',
             payload_type = 'list',
-            require_auth = True
+            require_auth = True,
+            invalidates = list_invalidates
         )(self)
 
     def update_list(self, slug, *args, **kargs):
@@ -521,7 +572,8 @@ class API(object):
             method = 'POST',
             payload_type = 'list',
             allowed_param = ['name', 'mode', 'description'],
-            require_auth = True
+            require_auth = True,
+            invalidates = list_invalidates
         )(self, *args, **kargs)
 
     lists = bind_api(
@@ -563,7 +615,8 @@ class API(object):
             method = 'POST',
             payload_type = 'list',
             allowed_param = ['id'],
-            require_auth = True
+            require_auth = True,
+            invalidates = list_member_invalidates
         )(self, *args, **kargs)
 
     def remove_list_member(self, slug, *args, **kargs):
@@ -572,7 +625,8 @@ class API(object):
             method = 'DELETE',
             payload_type = 'list',
             allowed_param = ['id'],
-            require_auth = True
+            require_auth = True,
+            invalidates = list_member_invalidates
         )(self, *args, **kargs)
 
     list_members = bind_api(
@@ -595,7 +649,9 @@ class API(object):
         method = 'POST',
         payload_type = 'list',
         allowed_param = ['owner', 'slug'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/{owner}/{slug}/subscribers.json', '/*/*/subscribers/*',
+                       '/{user}/lists/subscriptions.json']
     )
 
     unsubscribe_list = bind_api(
@@ -603,7 +659,9 @@ class API(object):
         method = 'DELETE',
         payload_type = 'list',
         allowed_param = ['owner', 'slug'],
-        require_auth = True
+        require_auth = True,
+        invalidates = ['/{owner}/{slug}/subscribers.json', '/*/*/subscribers/*',
+                       '/{user}/lists/subscriptions.json']
     )
 
     list_subscribers = bind_api(
@@ -654,7 +712,8 @@ class API(object):
     trends_current = bind_api(
         path = '/trends/current.json',
         payload_type = 'json',
-        allowed_param = ['exclude']
+        allowed_param = ['exclude'],
+        cache_timeout = 60
     )
 
     """ trends/daily """
@@ -689,7 +748,8 @@ class API(object):
     geo_id = bind_api(
         path = '/geo/id/{id}.json',
         payload_type = 'json',
-        allowed_param = ['id']
+        allowed_param = ['id'],
+        cache_timeout = 86400
     )
 
     """ Internal use only """
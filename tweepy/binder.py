@@ -6,12 +6,18 @@ import httplib
 import urllib
 import time
 import re
+import fnmatch
+import uuid
 
 from tweepy.error import TweepError
+from tweepy.models import Model, ColumnarResultSet
 from tweepy.utils import convert_to_utf8_str
 
 re_path_template = re.compile('{\w+}')
 
+# path patterns that some binding declares it invalidates
+invalidation_patterns = set()
+
 
 def bind_api(**config):
 
@@ -24,6 +30,8 @@ def bind_api(**config):
         method = config.get('method', 'GET')
         require_auth = config.get('require_auth', False)
         search_api = config.get('search_api', False)
+        cache_timeout = config.get('cache_timeout', None)
+        invalidates = config.get('invalidates', [])
 
         def __init__(self, api, args, kargs):
             # If authentication is required and no credentials
@@ -37,6 +45,13 @@ def bind_api(**config):
             self.retry_delay = kargs.pop('retry_delay', api.retry_delay)
             self.retry_errors = kargs.pop('retry_errors', api.retry_errors)
             self.headers = kargs.pop('headers', {})
+            self.refreshing = False
+            # only these keys of each returned object are parsed
+            self.fields = kargs.pop('fields', None)
+            self.parser = kargs.pop('parser', api.parser)
+            # None uses the cache's own timeout, 0 disables caching
+            self.cache_timeout = kargs.pop('cache_timeout',
+                    api.cache_policy.get(self.path, self.cache_timeout))
             self.build_parameters(args, kargs)
 
             # Pick correct URL root to use
@@ -103,19 +118,39 @@ def bind_api(**config):
             if len(self.parameters):
                 url = '%s?%s' % (url, urllib.urlencode(self.parameters))
 
-            # Query the cache if one is available
-            # and this request uses a GET method.
-            if self.api.cache and self.method == 'GET':
-                cache_result = self.api.cache.get(url)
+            # Query the cache if one is available, this request
+            # uses a GET method and the endpoint is cacheable.
+            use_cache = self.api.cache and self.method == 'GET' and \
+                    self.cache_timeout != 0
+            stale_result = None
+            if use_cache:
+                cache_key = self.build_cache_key(url)
+            if use_cache and not self.refreshing:
+                if self.api.stale_on_error:
+                    # Entries carry their fetch time so an expired one
+                    # can still be served if the request below fails.
+                    cache_result = self.api.cache.get(cache_key, 0)
+                    if cache_result:
+                        fetched, cache_result = cache_result
+                        if self.is_expired(fetched):
+                            stale_result, cache_result = cache_result, None
+                else:
+                    cache_result = self.api.cache.get(cache_key, self.cache_timeout)
+                # caches not derived from Cache keep no statistics
+                record_endpoint = getattr(self.api.cache, 'record_endpoint', None)
+                if record_endpoint:
+                    record_endpoint(APIMethod.path, bool(cache_result))
                 # if cache result found and not expired, return it
                 if cache_result:
-                    # must restore api reference
-                    if isinstance(cache_result, list):
-                        for result in cache_result:
-                            result._api = self.api
-                    else:
-                        cache_result._api = self.api
-                    return cache_result
+                    if self.api.refresher:
+                        self.api.refresher.read(cache_key, self.cache_ttl(), self)
+                    return self.restore_cached(cache_result)
+
+                # a recent 403 or 404 for this request is raised again
+                if self.api.negative_cache_timeout > 0:
+                    error_msg = self.read_error(cache_key)
+                    if error_msg:
+                        raise TweepError(error_msg)
 
             # Continue attempting request until successful
             # or maximum number of retries is reached.
@@ -140,6 +175,8 @@ def bind_api(**config):
                     conn.request(self.method, url, headers=self.headers, body=self.post_data)
                     resp = conn.getresponse()
                 except Exception, e:
+                    if stale_result:
+                        return self.restore_cached(stale_result)
                     raise TweepError('Failed to send request: %s' % e)
 
                 # Exit request loop if non-retry error code
@@ -152,26 +189,151 @@ def bind_api(**config):
                 time.sleep(self.retry_delay)
                 retries_performed += 1
 
-            # If an error was returned, throw an exception
-            self.api.last_response = resp
+            # If an error was returned, throw an exception.
+            # Background refreshes leave last_response to the
+            # foreground callers reading its status and headers.
+            if not self.refreshing:
+                self.api.last_response = resp
             if resp.status != 200:
+                if stale_result and resp.status >= 500:
+                    # upstream is failing, serve the expired entry
+                    return self.restore_cached(stale_result)
                 try:
-                    error_msg = self.api.parser.parse_error(resp.read())
+                    error_msg = self.parser.parse_error(resp.read())
                 except Exception:
                     error_msg = "Twitter error response: status code = %s" % resp.status
+                if use_cache and self.api.negative_cache_timeout > 0 and \
+                        resp.status in (403, 404):
+                    self.api.cache.store(cache_key + '#error',
+                            (time.time(), error_msg))
                 raise TweepError(error_msg, resp)
 
             # Parse the response payload
-            result = self.api.parser.parse(self, resp.read())
+            payload = resp.read()
+            result = self.parser.parse(self, payload)
 
             conn.close()
 
+            # Drop cached results this call has made out of date
+            if self.api.cache and self.invalidates:
+                self.invalidate_cache()
+
             # Store result into cache if one is available.
-            if self.api.cache and self.method == 'GET' and result:
-                self.api.cache.store(url, result)
+            # The raw payload is stored instead when cache_raw is set
+            # so entries stay small and independent of the parser.
+            if use_cache and result:
+                if self.api.cache_raw:
+                    value = payload
+                else:
+                    value = result
+                if self.api.stale_on_error:
+                    value = (time.time(), value)
+                self.api.cache.store(cache_key, value)
+                if self.api.refresher:
+                    self.api.refresher.stored(cache_key)
 
             return result
 
+        def cache_version_key(self, pattern):
+            # Versions are kept per set of credentials. They are named
+            # from local data only, get_username() may make a request.
+            namespace = ''
+            auth = self.api.auth
+            if auth:
+                token = getattr(auth, 'access_token', None)
+                if token is not None:
+                    namespace = token.key
+                else:
+                    namespace = getattr(auth, 'username', None) or ''
+            return '#version:%s:%s' % (namespace, pattern)
+
+        def build_cache_key(self, url):
+            # Endpoints that may be invalidated are cached under the
+            # current versions of their patterns, so bumping a version
+            # drops every entry stored under it at once.
+            versions = []
+            for pattern in sorted(invalidation_patterns):
+                if fnmatch.fnmatchcase(APIMethod.path, pattern):
+                    version = self.read_version(pattern)
+                    if version:
+                        versions.append(version)
+            if versions:
+                url = '%s#%s' % (url, ':'.join(versions))
+            # projected results are kept apart from full ones
+            if self.fields:
+                url = '%s#fields=%s' % (url, ','.join(sorted(self.fields)))
+            # and so are results of another parser
+            if self.parser is not self.api.parser:
+                url = '%s#parser=%s' % (url, self.parser.__class__.__name__)
+            # stale_on_error entries are (fetched, value) pairs
+            if self.api.stale_on_error:
+                url += '#stale'
+            return url
+
+        def peek_cache(self, key):
+            # Versions and remembered errors are not API results, so they
+            # are read without counting toward the cache statistics when
+            # possible.
+            peek = getattr(self.api.cache, 'peek', None)
+            if peek:
+                return peek(key)
+            return self.api.cache.get(key, 0)
+
+        def read_version(self, pattern):
+            return self.peek_cache(self.cache_version_key(pattern))
+
+        def read_error(self, cache_key):
+            # a peek ignores age, so the entry carries its own
+            entry = self.peek_cache(cache_key + '#error')
+            if not entry:
+                return None
+            created, error_msg = entry
+            if time.time() - created >= self.api.negative_cache_timeout:
+                return None
+            return error_msg
+
+        def invalidate_cache(self):
+            # unique even for mutations made within one clock tick
+            version = uuid.uuid4().hex
+            for pattern in self.invalidates:
+                self.api.cache.store(self.cache_version_key(pattern), version)
+
+        def cache_ttl(self):
+            if self.cache_timeout is None:
+                return self.api.cache.timeout
+            return self.cache_timeout
+
+        def is_expired(self, fetched):
+            timeout = self.cache_ttl()
+            return timeout > 0 and (time.time() - fetched) >= timeout
+
+        def refresh(self):
+            """Fetch again, bypassing the cache, and store the result"""
+            self.refreshing = True
+            try:
+                return self.execute()
+            finally:
+                self.refreshing = False
+
+        def restore_cached(self, cache_result):
+            if self.api.cache_raw:
+                # raw payload was cached, parse it again
+                return self.parser.parse(self, cache_result)
+
+            # must restore api reference
+            result = cache_result
+            if isinstance(result, tuple):
+                # (result, cursors) of a cursored method
+                result = result[0]
+            if not isinstance(result, list):
+                result = [result]
+            for obj in result:
+                if isinstance(obj, (Model, ColumnarResultSet)):
+                    obj._api = self.api
+            return cache_result
+
+
+    invalidation_patterns.update(APIMethod.invalidates)
 
     def _call(api, *args, **kargs):
 
@@ -4,8 +4,14 @@
 
 import time
 import threading
+import heapq
 import os
+import mmap
+import struct
+import Queue
 import cPickle as pickle
+import marshal
+import zlib
 
 try:
     import hashlib
@@ -20,6 +26,72 @@ except ImportError:
     # TODO: use win32file
     pass
 
+try:
+    import sqlite3
+except ImportError:
+    # Not available on Google App Engine
+    sqlite3 = None
+
+
+class PickleCodec(object):
+    """Encode cache values with pickle"""
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def encode(self, value):
+        return pickle.dumps(value, self.protocol)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+class MarshalCodec(object):
+    """Encode plain values (dicts, lists, strings, numbers) with marshal
+
+    Values marshal cannot handle, such as model instances, fall back
+    to pickle. A leading byte records which one was used.
+    """
+
+    def __init__(self):
+        self._pickle = PickleCodec()
+
+    def encode(self, value):
+        try:
+            return 'm' + marshal.dumps(value)
+        except ValueError:
+            return 'p' + self._pickle.encode(value)
+
+    def decode(self, data):
+        if data[0] == 'm':
+            return marshal.loads(data[1:])
+        return self._pickle.decode(data[1:])
+
+
+class ZlibCodec(object):
+    """Compress the output of another codec once it passes a size"""
+
+    def __init__(self, codec=None, threshold=512, level=6):
+        """Initialize the codec
+            codec: codec producing the bytes to compress [optional]
+            threshold: encoded size in bytes from which to compress
+            level: zlib compression level
+        """
+        self.codec = codec or PickleCodec()
+        self.threshold = threshold
+        self.level = level
+
+    def encode(self, value):
+        data = self.codec.encode(value)
+        if len(data) >= self.threshold:
+            return 'z' + zlib.compress(data, self.level)
+        return 'r' + data
+
+    def decode(self, data):
+        if data[0] == 'z':
+            return self.codec.decode(zlib.decompress(data[1:]))
+        return self.codec.decode(data[1:])
+
 
 class Cache(object):
     """Cache interface"""
@@ -29,6 +101,55 @@ class Cache(object):
             timeout: number of seconds to keep a cached entry
         """
         self.timeout = timeout
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the counters reported by stats()"""
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0,
+                       'evictions': 0, 'stores': 0}
+        self._endpoints = {}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, n=1):
+        # for backends that update counters outside their own lock
+        self._stats_lock.acquire()
+        self._stats[name] += n
+        self._stats_lock.release()
+
+    def record_endpoint(self, endpoint, hit):
+        """Count a cache lookup made for an API endpoint
+            endpoint: path of the API method
+            hit: True if the lookup found an entry
+        """
+        if getattr(self, '_stats_lock', None) is None:
+            # a subclass that did not call Cache.__init__
+            return
+        self._stats_lock.acquire()
+        try:
+            counts = self._endpoints.get(endpoint)
+            if counts is None:
+                counts = self._endpoints[endpoint] = {'hits': 0, 'misses': 0}
+            if hit:
+                counts['hits'] += 1
+            else:
+                counts['misses'] += 1
+        finally:
+            self._stats_lock.release()
+
+    def stats(self):
+        """Get a dict of hit, miss, expiry and eviction counters
+            The 'endpoints' item breaks hits and misses down by API path.
+        """
+        self._stats_lock.acquire()
+        try:
+            stats = dict(self._stats)
+            endpoints = {}
+            for endpoint, counts in self._endpoints.items():
+                endpoints[endpoint] = dict(counts)
+        finally:
+            self._stats_lock.release()
+        stats['endpoints'] = endpoints
+        return stats
 
     def store(self, key, value):
         """Add new record to cache
@@ -44,6 +165,34 @@ class Cache(object):
         """
         raise NotImplementedError
 
+    def store_many(self, items):
+        """Add many records to cache
+            items: dict or sequence of (key, value) pairs
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        for key, value in items:
+            self.store(key, value)
+
+    def get_many(self, keys, timeout=None):
+        """Get many cached entries at once
+            keys: which entries to get
+            timeout: override timeout with this value [optional]
+            Returns a dict of the keys found and not expired.
+        """
+        result = {}
+        for key in keys:
+            value = self.get(key, timeout)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def peek(self, key):
+        """Get an entry whatever its age, without counting it in stats()
+            Backends that keep statistics override this.
+        """
+        return self.get(key, 0)
+
     def count(self):
         """Get count of entries currently stored in cache"""
         raise NotImplementedError
@@ -57,12 +206,57 @@ class Cache(object):
         raise NotImplementedError
 
 
-class MemoryCache(Cache):
+class _ExpiryHeap(object):
+    """Mixin that finds expired entries through a heap of
+    (expire time, created time, key) ordered by expiration.
+
+    Subclasses provide _created_times() yielding (key, created time)
+    of every entry and _expire(key, created), which deletes the entry
+    if it is still the one created at that time and returns whether
+    it did. Call these with the cache lock held.
+    """
+
+    def _rebuild_expiry(self):
+        self._expiry = []
+        if self.timeout > 0:
+            for key, created in self._created_times():
+                self._expiry.append((created + self.timeout, created, key))
+            heapq.heapify(self._expiry)
+
+    def _push_expiry(self, key, created):
+        if self.timeout <= 0:
+            return
+        heapq.heappush(self._expiry, (created + self.timeout, created, key))
+        # overwritten keys leave stale heap items behind, compact
+        # the heap once they outnumber the live entries.
+        if len(self._expiry) > 2 * self.count() + 64:
+            self._rebuild_expiry()
+
+    def _reap(self, deadline=None):
+        """Delete expired entries from the head of the expiry heap.
+            deadline: stop once time.time() passes this [optional]
+            Returns True if expired entries may remain.
+        """
+        now = time.time()
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            expires, created, key = heapq.heappop(expiry)
+            # skip heap items left behind by a later store of the same key
+            if self._expire(key, created):
+                self._stats['expired'] += 1
+            if deadline is not None and time.time() >= deadline:
+                return bool(expiry) and expiry[0][0] <= now
+        return False
+
+
+class MemoryCache(Cache, _ExpiryHeap):
     """In-memory cache"""
 
     def __init__(self, timeout=60):
         Cache.__init__(self, timeout)
         self._entries = {}
+        self._expiry = []
+        self._reaper = None
         self.lock = threading.Lock()
 
     def __getstate__(self):
@@ -74,13 +268,30 @@ class MemoryCache(Cache):
         self.lock = threading.Lock()
         self._entries = state['entries']
         self.timeout = state['timeout']
+        self._reaper = None
+        self._rebuild_expiry()
+        self.reset_stats()
 
     def _is_expired(self, entry, timeout):
         return timeout > 0 and (time.time() - entry[0]) >= timeout
 
+    def _created_times(self):
+        for key, entry in self._entries.iteritems():
+            yield key, entry[0]
+
+    def _expire(self, key, created):
+        entry = self._entries.get(key)
+        if entry and entry[0] == created:
+            del self._entries[key]
+            return True
+        return False
+
     def store(self, key, value):
         self.lock.acquire()
-        self._entries[key] = (time.time(), value)
+        created = time.time()
+        self._entries[key] = (created, value)
+        self._push_expiry(key, created)
+        self._stats['stores'] += 1
         self.lock.release()
 
     def get(self, key, timeout=None):
@@ -90,6 +301,7 @@ class MemoryCache(Cache):
             entry = self._entries.get(key)
             if not entry:
                 # no hit, return nothing
+                self._stats['misses'] += 1
                 return None
 
             # use provided timeout in arguments if provided
@@ -101,29 +313,503 @@ class MemoryCache(Cache):
             if self._is_expired(entry, timeout):
                 # entry expired, delete and return nothing
                 del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
                 return None
 
             # entry found and not expired, return it
+            self._stats['hits'] += 1
             return entry[1]
         finally:
             self.lock.release()
 
+    def peek(self, key):
+        self.lock.acquire()
+        try:
+            entry = self._entries.get(key)
+        finally:
+            self.lock.release()
+        if entry:
+            return entry[1]
+        return None
+
     def count(self):
         return len(self._entries)
 
-    def cleanup(self):
+    def stats(self):
+        stats = Cache.stats(self)
+        stats['entries'] = len(self._entries)
+        return stats
+
+    def cleanup(self, time_slice=None):
+        """Delete any expired entries in cache.
+            time_slice: hold the lock for at most this many seconds,
+                        leaving the remainder for a later call [optional]
+            Returns True if expired entries may remain.
+        """
         self.lock.acquire()
         try:
-            for k, v in self._entries.items():
-                if self._is_expired(v, self.timeout):
-                    del self._entries[k]
+            if time_slice is None:
+                return self._reap()
+            return self._reap(time.time() + time_slice)
         finally:
             self.lock.release()
 
     def flush(self):
         self.lock.acquire()
         self._entries.clear()
+        self._expiry = []
+        self.lock.release()
+
+    def snapshot(self, path, batch=1000):
+        """Write the unexpired entries to a file for restore()
+            path: file to write, replaced atomically once complete
+            batch: number of entries copied per lock acquisition
+        """
+        self.lock.acquire()
+        keys = self._entries.keys()
+        self.lock.release()
+
+        tmp_path = path + '.tmp'
+        f = open(tmp_path, 'wb')
+        try:
+            pickle.dump({'version': 1, 'timeout': self.timeout}, f,
+                        pickle.HIGHEST_PROTOCOL)
+            for i in range(0, len(keys), batch):
+                # copy a batch under the lock, write it without the lock
+                records = []
+                self.lock.acquire()
+                try:
+                    for key in keys[i:i + batch]:
+                        entry = self._entries.get(key)
+                        if entry and not self._is_expired(entry, self.timeout):
+                            records.append((key, entry[0], entry[1]))
+                finally:
+                    self.lock.release()
+                for record in records:
+                    pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(None, f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+
+    def restore(self, path, background=True, batch=1000):
+        """Load entries written by snapshot()
+            path: snapshot file to read
+            background: load on a daemon thread so the cache can serve
+                        while loading; the thread is returned [optional]
+            batch: number of entries inserted per lock acquisition
+        """
+        if background:
+            loader = threading.Thread(target=self._restore, args=(path, batch))
+            loader.setDaemon(True)
+            loader.start()
+            return loader
+        self._restore(path, batch)
+
+    def _restore(self, path, batch):
+        f = open(path, 'rb')
+        try:
+            pickle.load(f)  # header
+            done = False
+            while not done:
+                records = []
+                while len(records) < batch:
+                    try:
+                        record = pickle.load(f)
+                    except EOFError:
+                        record = None
+                    if record is None:
+                        done = True
+                        break
+                    records.append(record)
+                self._insert(records)
+        finally:
+            f.close()
+
+    def _insert(self, records):
+        self.lock.acquire()
+        try:
+            for key, created, value in records:
+                if self._is_expired((created, value), self.timeout):
+                    continue
+                entry = self._entries.get(key)
+                if entry and entry[0] >= created:
+                    # stored since the snapshot was taken, keep it
+                    continue
+                self._entries[key] = (created, value)
+                self._push_expiry(key, created)
+        finally:
+            self.lock.release()
+
+    def start_reaper(self, interval=1.0, time_slice=0.005):
+        """Start a daemon thread that deletes expired entries
+            interval: seconds to sleep once no expired entries remain
+            time_slice: maximum seconds to hold the lock per pass
+        """
+        if self._reaper is not None:
+            return
+        self._reaper = _Reaper(self, interval, time_slice)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        """Stop the reaper thread started by start_reaper"""
+        if self._reaper is None:
+            return
+        self._reaper.stop()
+        self._reaper = None
+
+
+class _Reaper(threading.Thread):
+    """Background thread that runs a cache's cleanup in small slices"""
+
+    def __init__(self, cache, interval, time_slice):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.cache = cache
+        self.interval = interval
+        self.time_slice = time_slice
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.isSet():
+            if self.cache.cleanup(self.time_slice):
+                # more to do, give waiting readers a chance first
+                time.sleep(0)
+            else:
+                self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+
+
+class ShardedMemoryCache(Cache):
+    """In-memory cache split across independently locked shards"""
+
+    def __init__(self, timeout=60, shards=16):
+        Cache.__init__(self, timeout)
+        self._shards = [MemoryCache(timeout) for i in range(shards)]
+
+    def __getstate__(self):
+        # pickle
+        return {'shards': self._shards, 'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        # unpickle
+        self._shards = state['shards']
+        self.timeout = state['timeout']
+        self.reset_stats()
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def store(self, key, value):
+        self._shard(key).store(key, value)
+
+    def get(self, key, timeout=None):
+        return self._shard(key).get(key, timeout)
+
+    def peek(self, key):
+        return self._shard(key).peek(key)
+
+    def count(self):
+        c = 0
+        for shard in self._shards:
+            c += shard.count()
+        return c
+
+    def stats(self):
+        stats = Cache.stats(self)
+        stats['entries'] = 0
+        for shard in self._shards:
+            for name, value in shard.stats().items():
+                if name != 'endpoints':
+                    stats[name] += value
+        return stats
+
+    def cleanup(self, time_slice=None):
+        remaining = False
+        for shard in self._shards:
+            if shard.cleanup(time_slice):
+                remaining = True
+        return remaining
+
+    def flush(self):
+        for shard in self._shards:
+            shard.flush()
+
+    def start_reaper(self, interval=1.0, time_slice=0.005):
+        for shard in self._shards:
+            shard.start_reaper(interval, time_slice)
+
+    def stop_reaper(self):
+        for shard in self._shards:
+            shard.stop_reaper()
+
+
+class TieredCache(Cache):
+    """Small in-process LRU cache in front of a slower shared cache
+
+    Values are stored in the backend as (created time, value) so an
+    entry promoted from it expires when the backend's copy does.
+    """
+
+    def __init__(self, backend, size=1000, timeout=60):
+        """Initialize the cache
+            backend: slower Cache instance used as the second tier
+            size: maximum number of entries held in-process
+            timeout: number of seconds to keep an in-process entry
+        """
+        Cache.__init__(self, timeout)
+        self.backend = backend
+        self.size = size
+        self.lock = threading.Lock()
+        self._entries = {}
+        # circular doubly linked list of [prev, next, key, created, value]
+        # with the most recently used entry right after the root
+        self._root = root = []
+        root[:] = [root, root, None, None, None]
+
+    def __getstate__(self):
+        # pickle
+        return {'backend': self.backend, 'size': self.size,
+                'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        # unpickle
+        self.__init__(state['backend'], state['size'], state['timeout'])
+
+    def _unlink(self, link):
+        prev, next = link[0], link[1]
+        prev[1] = next
+        next[0] = prev
+
+    def _link_front(self, link):
+        root = self._root
+        first = root[1]
+        link[0] = root
+        link[1] = first
+        first[0] = link
+        root[1] = link
+
+    def _put(self, key, value, created):
+        # caller must hold the lock
+        link = self._entries.get(key)
+        if link is not None:
+            self._unlink(link)
+        elif len(self._entries) >= self.size:
+            # evict the least recently used entry
+            last = self._root[0]
+            self._unlink(last)
+            del self._entries[last[2]]
+            self._stats['evictions'] += 1
+        link = [None, None, key, created, value]
+        self._link_front(link)
+        self._entries[key] = link
+
+    def store(self, key, value):
+        created = time.time()
+        self.lock.acquire()
+        try:
+            self._put(key, value, created)
+            self._stats['stores'] += 1
+        finally:
+            self.lock.release()
+        self.backend.store(key, (created, value))
+
+    def get(self, key, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        self.lock.acquire()
+        try:
+            link = self._entries.get(key)
+            if link is not None:
+                if timeout > 0 and (time.time() - link[3]) >= timeout:
+                    self._unlink(link)
+                    del self._entries[key]
+                    self._stats['expired'] += 1
+                else:
+                    self._unlink(link)
+                    self._link_front(link)
+                    self._stats['hits'] += 1
+                    return link[4]
+            self._stats['misses'] += 1
+        finally:
+            self.lock.release()
+
+        entry = self.backend.get(key, timeout)
+        if entry is None:
+            return None
+        created, value = entry
+        if timeout > 0 and (time.time() - created) >= timeout:
+            return None
+
+        # promote into the in-process tier, keeping the creation
+        # time so it is not kept longer than the backend's copy
+        self.lock.acquire()
+        try:
+            self._put(key, value, created)
+        finally:
+            self.lock.release()
+        return value
+
+    def peek(self, key):
+        # the backend is read so changes made by other processes are seen
+        entry = self.backend.peek(key)
+        if entry is None:
+            return None
+        return entry[1]
+
+    def count(self):
+        return self.backend.count()
+
+    def stats(self):
+        """Get counters for the in-process tier
+            The 'backend' item holds the stats of the second tier.
+        """
+        stats = Cache.stats(self)
+        stats['entries'] = len(self._entries)
+        stats['backend'] = self.backend.stats()
+        return stats
+
+    def cleanup(self):
+        self.lock.acquire()
+        try:
+            now = time.time()
+            for key, link in self._entries.items():
+                if self.timeout > 0 and (now - link[3]) >= self.timeout:
+                    self._unlink(link)
+                    del self._entries[key]
+                    self._stats['expired'] += 1
+        finally:
+            self.lock.release()
+        self.backend.cleanup()
+
+    def flush(self):
+        self.lock.acquire()
+        try:
+            self._entries.clear()
+            root = self._root
+            root[:] = [root, root, None, None, None]
+        finally:
+            self.lock.release()
+        self.backend.flush()
+
+
+class MemcacheCache(Cache):
+    """Cache backed by a memcached client
+
+    The client must provide the python-memcached interface (get, set,
+    flush_all) as google.appengine.api.memcache and memcache.Client do.
+    """
+
+    def __init__(self, client, timeout=60, prefix='tweepy:'):
+        Cache.__init__(self, timeout)
+        self.client = client
+        self.prefix = prefix
+
+    def _get_key(self, key):
+        # memcached keys are limited to 250 bytes without whitespace
+        md5 = hashlib.md5()
+        md5.update(key)
+        return self.prefix + md5.hexdigest()
+
+    def store(self, key, value):
+        self.client.set(self._get_key(key), (time.time(), value),
+                        time=max(self.timeout, 0))
+        self._count('stores')
+
+    def get(self, key, timeout=None):
+        entry = self.client.get(self._get_key(key))
+        if entry is None:
+            self._count('misses')
+            return None
+        if timeout is None:
+            timeout = self.timeout
+        if timeout > 0 and (time.time() - entry[0]) >= timeout:
+            self._count('expired')
+            self._count('misses')
+            return None
+        self._count('hits')
+        return entry[1]
+
+    def peek(self, key):
+        entry = self.client.get(self._get_key(key))
+        if entry is None:
+            return None
+        return entry[1]
+
+    def count(self):
+        stats = getattr(self.client, 'get_stats', None)
+        if stats is None:
+            raise NotImplementedError
+        stats = stats()
+        if isinstance(stats, list):
+            # memcache.Client returns [(server, stats), ...]
+            c = 0
+            for server, server_stats in stats:
+                c += int(server_stats.get('curr_items', 0))
+            return c
+        return int(stats.get('items', 0))
+
+    def cleanup(self):
+        # memcached expires entries by itself
+        pass
+
+    def flush(self):
+        self.client.flush_all()
+
+
+# LocalMemcacheClient.set takes a "time" argument that shadows the module
+_now = time.time
+
+
+class LocalMemcacheClient(object):
+    """In-process stand-in for a memcached client"""
+
+    def __init__(self):
+        self._data = {}
+        self.lock = threading.Lock()
+
+    def set(self, key, value, time=0):
+        if time > 0:
+            expires = _now() + time
+        else:
+            expires = None
+        self.lock.acquire()
+        self._data[key] = (expires, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
         self.lock.release()
+        return True
+
+    def get(self, key):
+        self.lock.acquire()
+        try:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= _now():
+                del self._data[key]
+                return None
+            data = entry[1]
+        finally:
+            self.lock.release()
+        return pickle.loads(data)
+
+    def delete(self, key):
+        self.lock.acquire()
+        try:
+            return self._data.pop(key, None) is not None
+        finally:
+            self.lock.release()
+
+    def flush_all(self):
+        self.lock.acquire()
+        self._data.clear()
+        self.lock.release()
+        return True
+
+    def get_stats(self):
+        return {'items': len(self._data)}
 
 
 class FileCache(Cache):
@@ -132,11 +818,19 @@ class FileCache(Cache):
     # locks used to make cache thread-safe
     cache_locks = {}
 
-    def __init__(self, cache_dir, timeout=60):
+    def __init__(self, cache_dir, timeout=60, codec=None):
+        """Initialize the cache
+            cache_dir: directory holding the cache files
+            timeout: number of seconds to keep a cached entry
+            codec: encode values with this codec instead of
+                   pickling them with the entry [optional]
+        """
         Cache.__init__(self, timeout)
         if os.path.exists(cache_dir) is False:
             os.mkdir(cache_dir)
         self.cache_dir = cache_dir
+        self.codec = codec
+        self._stats['bytes_read'] = self._stats['bytes_written'] = 0
         if cache_dir in FileCache.cache_locks:
             self.lock = FileCache.cache_locks[cache_dir]
         else:
@@ -203,7 +897,11 @@ class FileCache(Cache):
             datafile = open(path, 'wb')
 
             # write data
-            pickle.dump((time.time(), value), datafile)
+            if self.codec:
+                value = self.codec.encode(value)
+            pickle.dump((time.time(), value), datafile, pickle.HIGHEST_PROTOCOL)
+            self._stats['bytes_written'] += datafile.tell()
+            self._stats['stores'] += 1
 
             # close and unlock file
             datafile.close()
@@ -212,7 +910,12 @@ class FileCache(Cache):
             self.lock.release()
 
     def get(self, key, timeout=None):
-        return self._get(self._get_path(key), timeout)
+        value = self._get(self._get_path(key), timeout)
+        if value is None:
+            self._count('misses')
+        else:
+            self._count('hits')
+        return value
 
     def _get(self, path, timeout):
         if os.path.exists(path) is False:
@@ -226,7 +929,10 @@ class FileCache(Cache):
 
             # read pickled object
             created_time, value = pickle.load(datafile)
+            self._stats['bytes_read'] += datafile.tell()
             datafile.close()
+            if self.codec:
+                value = self.codec.decode(value)
 
             # check if value is expired
             if timeout is None:
@@ -235,6 +941,7 @@ class FileCache(Cache):
                 # expired! delete from cache
                 value = None
                 self._delete_file(path)
+                self._stats['expired'] += 1
 
             # unlock and return result
             self._unlock_file(f_lock)
@@ -242,6 +949,9 @@ class FileCache(Cache):
         finally:
             self.lock.release()
 
+    def peek(self, key):
+        return self._get(self._get_path(key), 0)
+
     def count(self):
         c = 0
         for entry in os.listdir(self.cache_dir):
@@ -262,3 +972,571 @@ class FileCache(Cache):
                 continue
             self._delete_file(os.path.join(self.cache_dir, entry))
 
+
+
+class LogFileCache(Cache, _ExpiryHeap):
+    """Log-structured file cache
+
+    Records are appended to segment files inside cache_dir and found
+    through an in-memory index that is rebuilt from the segments on
+    startup. Only one process may use a cache_dir at a time.
+    """
+
+    # record header: created time, key length, value length
+    _header = struct.Struct('!dII')
+    # value length of a tombstone, a record without value that
+    # hides the records of its key in older segments
+    _tombstone = 0xFFFFFFFF
+
+    def __init__(self, cache_dir, timeout=60, segment_size=4194304, codec=None):
+        Cache.__init__(self, timeout)
+        if os.path.exists(cache_dir) is False:
+            os.mkdir(cache_dir)
+        self.cache_dir = cache_dir
+        self.segment_size = segment_size
+        self.codec = codec or PickleCodec()
+        self.lock = threading.Lock()
+        self._reaper = None
+        self._stats['bytes_read'] = self._stats['bytes_written'] = 0
+        self._load()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.cache_dir, '%08d.seg' % segment)
+
+    def _list_segments(self):
+        segments = []
+        for entry in os.listdir(self.cache_dir):
+            if entry.endswith('.seg'):
+                segments.append(int(entry[:-4]))
+        segments.sort()
+        return segments
+
+    def _load(self):
+        # key -> (segment, value offset, value length, created time)
+        self._index = {}
+        # segment -> keys whose live record is in that segment
+        self._segment_keys = {}
+        # segment -> bytes used by live records
+        self._live = {}
+        # segment -> read-only mmap of the segment file
+        self._maps = {}
+        # key -> (segment, record length) of its latest tombstone
+        self._tombstones = {}
+        self._expiry = []
+
+        segments = self._list_segments()
+        for segment in segments:
+            self._load_segment(segment)
+        if segments:
+            self._active_id = segments[-1]
+        else:
+            self._active_id = 0
+        self._open_active()
+
+    def _load_segment(self, segment):
+        path = self._segment_path(segment)
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+
+        now = time.time()
+        header_size = self._header.size
+        offset = 0
+        while offset + header_size <= len(data):
+            created, key_len, value_len = self._header.unpack_from(data, offset)
+            if value_len == self._tombstone:
+                end = offset + header_size + key_len
+            else:
+                end = offset + header_size + key_len + value_len
+            if end > len(data):
+                break
+            key = data[offset + header_size:offset + header_size + key_len]
+            self._discard(key)
+            if value_len == self._tombstone:
+                self._add_tombstone(key, segment, end - offset)
+            elif self.timeout <= 0 or (now - created) < self.timeout:
+                self._add(key, segment, end - value_len, value_len,
+                          created, end - offset)
+            offset = end
+
+        self._segment_keys.setdefault(segment, set())
+        self._live.setdefault(segment, 0)
+        if offset < len(data):
+            # drop a record left incomplete by a crash mid-write
+            f = open(path, 'r+b')
+            f.truncate(offset)
+            f.close()
+
+    def _add(self, key, segment, offset, value_len, created, record_len):
+        # a newer record hides older ones itself
+        self._forget_tombstone(key)
+        self._index[key] = (segment, offset, value_len, created)
+        self._segment_keys.setdefault(segment, set()).add(key)
+        self._live[segment] = self._live.get(segment, 0) + record_len
+        self._push_expiry(key, created)
+
+    def _discard(self, key):
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        segment, offset, value_len = entry[:3]
+        self._segment_keys[segment].discard(key)
+        self._live[segment] -= self._header.size + len(key) + value_len
+
+    def _add_tombstone(self, key, segment, record_len):
+        self._forget_tombstone(key)
+        self._tombstones[key] = (segment, record_len)
+        # tombstones count as live so they are not compacted over and over
+        self._live[segment] = self._live.get(segment, 0) + record_len
+
+    def _forget_tombstone(self, key):
+        tombstone = self._tombstones.pop(key, None)
+        if tombstone is not None:
+            self._live[tombstone[0]] -= tombstone[1]
+
+    def _created_times(self):
+        for key, entry in self._index.iteritems():
+            yield key, entry[3]
+
+    def _expire(self, key, created):
+        entry = self._index.get(key)
+        if entry and entry[3] == created:
+            self._discard(key)
+            return True
+        return False
+
+    def _open_active(self):
+        self._active = open(self._segment_path(self._active_id), 'ab')
+        self._active.seek(0, 2)
+        self._segment_keys.setdefault(self._active_id, set())
+        self._live.setdefault(self._active_id, 0)
+
+    def _write(self, key, created, data, value_len):
+        # returns the offset of the record in the active segment
+        if self._active.tell() >= self.segment_size:
+            self._active.close()
+            self._active_id += 1
+            self._open_active()
+        offset = self._active.tell()
+        self._active.write(self._header.pack(created, len(key), value_len))
+        self._active.write(key)
+        self._active.write(data)
+        self._active.flush()
+        return offset
+
+    def _append(self, key, created, data):
+        offset = self._write(key, created, data, len(data))
+        self._discard(key)
+        record_len = self._header.size + len(key) + len(data)
+        self._add(key, self._active_id, offset + record_len - len(data),
+                  len(data), created, record_len)
+
+    def _append_tombstone(self, key):
+        self._write(key, time.time(), '', self._tombstone)
+        self._add_tombstone(key, self._active_id, self._header.size + len(key))
+
+    def _read(self, segment, offset, length):
+        return self._map(segment, offset + length)[offset:offset + length]
+
+    def _map(self, segment, size=0):
+        m = self._maps.get(segment)
+        if m is None or len(m) < size:
+            # segment grew since it was mapped, map it again
+            if m is not None:
+                m.close()
+            f = open(self._segment_path(segment), 'rb')
+            try:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            finally:
+                f.close()
+            self._maps[segment] = m
+        return m
+
+    def _drop_segment(self, segment):
+        m = self._maps.pop(segment, None)
+        if m is not None:
+            m.close()
+        del self._segment_keys[segment]
+        del self._live[segment]
+        os.remove(self._segment_path(segment))
+
+    def _compact(self, segment):
+        # Move live records to the active segment, then drop the file.
+        # A key deleted after its record here was written gets a
+        # tombstone, or its record in an older segment would be
+        # loaded again on the next startup.
+        older = min(self._live) < segment
+        # a map made by an earlier get may end before the segment does
+        m = self._map(segment, os.path.getsize(self._segment_path(segment)))
+        header_size = self._header.size
+        offset = 0
+        while offset + header_size <= len(m):
+            created, key_len, value_len = self._header.unpack_from(m, offset)
+            start = offset + header_size + key_len
+            key = m[offset + header_size:start]
+            if value_len == self._tombstone:
+                offset = start
+                if self._tombstones.get(key, (None,))[0] == segment:
+                    if older:
+                        self._append_tombstone(key)
+                    else:
+                        self._forget_tombstone(key)
+                continue
+            offset = start + value_len
+            entry = self._index.get(key)
+            if entry is not None:
+                if entry[:2] == (segment, start):
+                    self._append(key, created, m[start:offset])
+            elif older and self._tombstones.get(key, (-1,))[0] < segment:
+                self._append_tombstone(key)
+        self._drop_segment(segment)
+
+    def store(self, key, value):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        data = self.codec.encode(value)
+        self.lock.acquire()
+        try:
+            self._append(key, time.time(), data)
+            self._stats['stores'] += 1
+            self._stats['bytes_written'] += len(data)
+        finally:
+            self.lock.release()
+
+    def get(self, key, timeout=None):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        self.lock.acquire()
+        try:
+            entry = self._index.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            segment, offset, value_len, created = entry
+
+            if timeout is None:
+                timeout = self.timeout
+            if timeout > 0 and (time.time() - created) >= timeout:
+                # expired! forget it, cleanup reclaims the space
+                self._discard(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            data = self._read(segment, offset, value_len)
+            self._stats['hits'] += 1
+            self._stats['bytes_read'] += value_len
+        finally:
+            self.lock.release()
+        return self.codec.decode(data)
+
+    def peek(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        self.lock.acquire()
+        try:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            data = self._read(entry[0], entry[1], entry[2])
+        finally:
+            self.lock.release()
+        return self.codec.decode(data)
+
+    def count(self):
+        return len(self._index)
+
+    def stats(self):
+        stats = Cache.stats(self)
+        self.lock.acquire()
+        try:
+            stats['entries'] = len(self._index)
+            stats['live_bytes'] = sum(self._live.values())
+            stats['segments'] = len(self._live)
+        finally:
+            self.lock.release()
+        return stats
+
+    def cleanup(self, time_slice=None):
+        """Forget expired entries and compact segments that are mostly dead.
+            time_slice: hold the lock for at most this many seconds,
+                        leaving the remainder for a later call [optional]
+            Returns True if expired entries or segments to compact may remain.
+        """
+        self.lock.acquire()
+        try:
+            if time_slice is None:
+                deadline = None
+            else:
+                deadline = time.time() + time_slice
+            if self._reap(deadline):
+                return True
+
+            for segment in sorted(self._live.keys()):
+                if segment == self._active_id:
+                    continue
+                size = os.path.getsize(self._segment_path(segment))
+                if self._live[segment] * 2 > size:
+                    continue
+                self._compact(segment)
+                if deadline is not None and time.time() >= deadline:
+                    return True
+            return False
+        finally:
+            self.lock.release()
+
+    def flush(self):
+        self.lock.acquire()
+        try:
+            self._active.close()
+            for m in self._maps.values():
+                m.close()
+            for segment in self._list_segments():
+                os.remove(self._segment_path(segment))
+            self._load()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """Close the active segment and any mapped segments"""
+        self.stop_reaper()
+        self.lock.acquire()
+        try:
+            self._active.close()
+            for m in self._maps.values():
+                m.close()
+            self._maps.clear()
+        finally:
+            self.lock.release()
+
+    def start_reaper(self, interval=1.0, time_slice=0.005):
+        """Start a daemon thread that compacts segments in the background
+            interval: seconds to sleep once nothing is left to compact
+            time_slice: maximum seconds to hold the lock per pass
+        """
+        if self._reaper is not None:
+            return
+        self._reaper = _Reaper(self, interval, time_slice)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        """Stop the reaper thread started by start_reaper"""
+        if self._reaper is None:
+            return
+        self._reaper.stop()
+        self._reaper = None
+
+
+class SQLiteCache(Cache):
+    """SQLite-based cache
+
+    Entries live in a single database file indexed by creation time.
+    The database runs in WAL mode so several processes on one host can
+    share it.
+    """
+
+    # keep below SQLite's default limit of 999 bound variables
+    _batch_size = 500
+
+    def __init__(self, path, timeout=60, busy_timeout=5.0, codec=None):
+        Cache.__init__(self, timeout)
+        if sqlite3 is None:
+            raise ImportError('SQLiteCache requires the sqlite3 module')
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.codec = codec or PickleCodec()
+        self._local = threading.local()
+        self._stats['bytes_read'] = self._stats['bytes_written'] = 0
+
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                     'key TEXT PRIMARY KEY, created REAL, value BLOB)')
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_created '
+                     'ON cache (created)')
+        conn.commit()
+
+    def __getstate__(self):
+        # pickle
+        return {'path': self.path, 'timeout': self.timeout,
+                'busy_timeout': self.busy_timeout, 'codec': self.codec}
+
+    def __setstate__(self, state):
+        # unpickle
+        self.__init__(state['path'], state['timeout'], state['busy_timeout'],
+                      state['codec'])
+
+    def _connect(self):
+        # sqlite3 connections may not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.text_factory = str
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _expired_before(self, timeout):
+        if timeout is None:
+            timeout = self.timeout
+        if timeout > 0:
+            return time.time() - timeout
+        return None
+
+    def store(self, key, value):
+        self.store_many(((key, value),))
+
+    def store_many(self, items):
+        if isinstance(items, dict):
+            items = items.items()
+        now = time.time()
+        rows = [(key, now, sqlite3.Binary(self.codec.encode(value)))
+                for key, value in items]
+        conn = self._connect()
+        conn.executemany('INSERT OR REPLACE INTO cache (key, created, value) '
+                         'VALUES (?, ?, ?)', rows)
+        conn.commit()
+        self._count('stores', len(rows))
+        self._count('bytes_written', sum([len(row[2]) for row in rows]))
+
+    def get(self, key, timeout=None):
+        return self.get_many((key,), timeout).get(key)
+
+    def get_many(self, keys, timeout=None):
+        keys = list(keys)
+        expired_before = self._expired_before(timeout)
+        conn = self._connect()
+        result = {}
+        bytes_read = 0
+        for i in range(0, len(keys), self._batch_size):
+            batch = keys[i:i + self._batch_size]
+            sql = 'SELECT key, value FROM cache WHERE key IN (%s)' % \
+                    ','.join('?' * len(batch))
+            if expired_before is not None:
+                sql += ' AND created > ?'
+                batch = batch + [expired_before]
+            for key, value in conn.execute(sql, batch):
+                result[key] = self.codec.decode(str(value))
+                bytes_read += len(value)
+        self._count('bytes_read', bytes_read)
+        self._count('hits', len(result))
+        self._count('misses', len(keys) - len(result))
+        return result
+
+    def peek(self, key):
+        row = self._connect().execute('SELECT value FROM cache WHERE key = ?',
+                                      (key,)).fetchone()
+        if row is None:
+            return None
+        return self.codec.decode(str(row[0]))
+
+    def count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def stats(self):
+        stats = Cache.stats(self)
+        stats['entries'] = self.count()
+        return stats
+
+    def cleanup(self):
+        expired_before = self._expired_before(None)
+        if expired_before is None:
+            return
+        conn = self._connect()
+        cursor = conn.execute('DELETE FROM cache WHERE created <= ?', (expired_before,))
+        conn.commit()
+        self._count('expired', cursor.rowcount)
+
+    def flush(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM cache')
+        conn.commit()
+
+
+class RefreshAhead(object):
+    """Re-fetch frequently read API results shortly before they expire
+
+    Pass an instance to API(refresher=...). Reads are counted per cache
+    key over the lifetime of each stored entry, and once an entry has
+    been read threshold times it is fetched again on a background thread
+    when it enters the last lead fraction of its lifetime.
+    """
+
+    def __init__(self, threshold=3, lead=0.1, max_keys=10000):
+        """Initialize the refresher
+            threshold: reads within one entry lifetime that make it hot
+            lead: fraction of the lifetime left when it is refreshed
+            max_keys: maximum number of keys to track
+        """
+        self.threshold = threshold
+        self.lead = lead
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        # key -> [time stored, reads since stored]
+        self._keys = {}
+        self._pending = set()
+        self._queue = Queue.Queue()
+        self._worker = None
+
+    def stored(self, key):
+        """Note that a fresh entry was stored under key"""
+        self.lock.acquire()
+        try:
+            if key not in self._keys and len(self._keys) >= self.max_keys:
+                # forget everything rather than track keys without bound
+                self._keys.clear()
+            self._keys[key] = [time.time(), 0]
+            self._pending.discard(key)
+        finally:
+            self.lock.release()
+
+    def read(self, key, timeout, method):
+        """Count a cache hit and schedule a refresh if key is hot
+            key: cache key that was read
+            timeout: lifetime of the entry in seconds
+            method: bound API method able to fetch the entry again
+        """
+        self.lock.acquire()
+        try:
+            entry = self._keys.get(key)
+            if entry is None or timeout <= 0:
+                return
+            entry[1] += 1
+            if entry[1] < self.threshold or key in self._pending:
+                return
+            if time.time() < entry[0] + timeout * (1 - self.lead):
+                return
+            self._pending.add(key)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run)
+                self._worker.setDaemon(True)
+                self._worker.start()
+        finally:
+            self.lock.release()
+        self._queue.put((key, method))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            key, method = item
+            try:
+                method.refresh()
+            except Exception:
+                # the next read will fetch it again instead
+                pass
+            self.lock.acquire()
+            self._pending.discard(key)
+            self.lock.release()
+
+    def stop(self):
+        """Stop the background worker"""
+        self.lock.acquire()
+        try:
+            if self._worker is None:
+                return
+            self._worker = None
+        finally:
+            self.lock.release()
+        self._queue.put(None)
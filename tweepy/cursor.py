@@ -2,19 +2,33 @@
 # Copyright 2009-2010 Joshua Roesslein
 # See LICENSE for details.
 
+import sys
+import threading
+import Queue
+
 from tweepy.error import TweepError
 
 class Cursor(object):
     """Pagination helper class"""
 
     def __init__(self, method, *args, **kargs):
+        # number of pages to fetch ahead on a background thread
+        prefetch = kargs.pop('prefetch', 0)
+        # number of numbered pages to fetch at once
+        parallel = kargs.pop('parallel', 0)
         if hasattr(method, 'pagination_mode'):
             if method.pagination_mode == 'cursor':
+                if parallel > 0:
+                    raise TweepError('Cursored pages can not be fetched in parallel')
                 self.iterator = CursorIterator(method, args, kargs)
+            elif parallel > 0:
+                self.iterator = ParallelPageIterator(method, args, kargs, parallel)
             else:
                 self.iterator = PageIterator(method, args, kargs)
         else:
             raise TweepError('This method does not perform pagination')
+        if prefetch > 0:
+            self.iterator = PrefetchIterator(self.iterator, prefetch)
 
     def pages(self, limit=0):
         """Return iterator for pages"""
@@ -93,6 +107,143 @@ class PageIterator(BaseIterator):
         self.current_page -= 1
         return self.method(page=self.current_page, *self.args, **self.kargs)
 
+class _PageFetch(threading.Thread):
+
+    def __init__(self, method, page, args, kargs):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.method = method
+        self.page = page
+        self.args = args
+        self.kargs = kargs
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.method(page=self.page, *self.args, **self.kargs)
+        except Exception:
+            self.error = sys.exc_info()
+
+    def is_empty(self):
+        return not self.isAlive() and self.error is None and len(self.result) == 0
+
+class ParallelPageIterator(PageIterator):
+    """
+    Fetch several numbered pages at once and return them in order.
+    Requests for pages past the last one are counted in wasted,
+    at most parallel - 1 of them are made.
+    """
+
+    def __init__(self, method, args, kargs, parallel):
+        PageIterator.__init__(self, method, args, kargs)
+        self.parallel = parallel
+        self.fetches = []
+        self.next_fetch = 1
+        self.finished = False
+        self.wasted = 0
+
+    def fill(self):
+        # no more requests once some page came back empty
+        for fetch in self.fetches:
+            if fetch.is_empty():
+                return
+        while not self.finished and len(self.fetches) < self.parallel:
+            if self.limit > 0 and self.next_fetch > self.limit:
+                return
+            fetch = _PageFetch(self.method, self.next_fetch, self.args, self.kargs)
+            fetch.start()
+            self.fetches.append(fetch)
+            self.next_fetch += 1
+
+    def finish(self):
+        self.finished = True
+        # pages requested after this one are not wanted
+        self.wasted += len(self.fetches)
+        self.fetches = []
+
+    def next(self):
+        self.fill()
+        if not self.fetches:
+            raise StopIteration
+        fetch = self.fetches.pop(0)
+        fetch.join()
+        self.current_page = fetch.page
+        if fetch.error is not None:
+            self.finish()
+            raise fetch.error[0], fetch.error[1], fetch.error[2]
+        if len(fetch.result) == 0:
+            self.finish()
+            raise StopIteration
+        self.fill()
+        return fetch.result
+
+# marks the end of the pages in a prefetch queue
+_end = object()
+
+def _prefetch(iterator, queue, cancelled):
+    # Runs on the prefetch thread. It must not reference the
+    # PrefetchIterator, so dropping that cancels the thread.
+    while not cancelled.isSet():
+        try:
+            item = (iterator.next(), None)
+        except StopIteration:
+            item = (_end, None)
+        except Exception:
+            item = (None, sys.exc_info())
+        while not cancelled.isSet():
+            try:
+                queue.put(item, True, 0.1)
+                break
+            except Queue.Full:
+                pass
+        if item[0] is _end or item[1] is not None:
+            return
+
+class PrefetchIterator(object):
+    """Fetch the pages of another iterator ahead on a background thread"""
+
+    def __init__(self, iterator, prefetch):
+        self.iterator = iterator
+        self.limit = 0
+        self.queue = Queue.Queue(prefetch)
+        self.cancelled = threading.Event()
+        self.thread = None
+        self.done = False
+
+    def next(self):
+        if self.done:
+            raise StopIteration
+        if self.thread is None:
+            self.iterator.limit = self.limit
+            self.thread = threading.Thread(target=_prefetch,
+                    args=(self.iterator, self.queue, self.cancelled))
+            self.thread.setDaemon(True)
+            self.thread.start()
+        page, error = self.queue.get()
+        if error is not None:
+            # raise the fetch error here, where the page was wanted
+            self.close()
+            raise error[0], error[1], error[2]
+        if page is _end:
+            self.done = True
+            raise StopIteration
+        return page
+
+    def prev(self):
+        raise TweepError('Can not page back while prefetching')
+
+    def close(self):
+        """Stop fetching ahead"""
+        self.done = True
+        self.cancelled.set()
+
+    def __iter__(self):
+        return self
+
+    def __del__(self):
+        self.cancelled.set()
+
 class ItemIterator(BaseIterator):
 
     def __init__(self, page_iterator):
@@ -104,6 +255,8 @@ class ItemIterator(BaseIterator):
 
     def next(self):
         if self.limit > 0 and self.count == self.limit:
+            if hasattr(self.page_iterator, 'close'):
+                self.page_iterator.close()
             raise StopIteration
         if self.current_page is None or self.page_index == len(self.current_page) - 1:
             # Reached end of current page, get the next page...
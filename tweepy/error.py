@@ -6,9 +6,14 @@ class TweepError(Exception):
     """Tweepy exception"""
 
     def __init__(self, reason, response=None):
-        self.reason = str(reason)
+        if isinstance(reason, unicode):
+            self.reason = reason
+        else:
+            self.reason = str(reason)
         self.response = response
 
     def __str__(self):
+        if isinstance(self.reason, unicode):
+            return self.reason.encode('utf-8')
         return self.reason
 
@@ -2,28 +2,244 @@
 # Copyright 2009-2010 Joshua Roesslein
 # See LICENSE for details.
 
+import calendar
+from datetime import datetime
+import threading
+
+try:
+    import numpy
+except ImportError:
+    # ColumnarResultSet is unavailable without numpy
+    numpy = None
+
 from tweepy.error import TweepError
 from tweepy.utils import parse_datetime, parse_html_value, parse_a_href, \
-        parse_search_datetime, unescape_html
+        parse_search_datetime, parse_search_source, format_datetime, json_dumps
+
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# values that are already JSON-ready
+_plain_types = (unicode, str, int, long, float, bool, type(None), dict)
+
+
+def _to_json_value(value, datetime_format):
+    if type(value) in _plain_types:
+        return value
+    elif isinstance(value, Model):
+        return value.to_dict(datetime_format=datetime_format)
+    elif isinstance(value, datetime):
+        return format_datetime(value, datetime_format)
+    elif isinstance(value, (list, tuple)):
+        return [_to_json_value(v, datetime_format) for v in value]
+    return value
 
 
 class ResultSet(list):
     """A list like object that holds results from a Twitter API query."""
 
+    def to_dicts(self, fields=None, datetime_format=ISO_FORMAT):
+        """Yield the dict of each result, see Model.to_dict"""
+        for result in self:
+            yield result.to_dict(fields, datetime_format)
+
+    def iter_json(self, fields=None, datetime_format=ISO_FORMAT):
+        """Yield the results as a JSON array, one chunk per result"""
+        separator = '['
+        for result in self:
+            yield separator + result.to_json(fields, datetime_format)
+            separator = ','
+        if separator == '[':
+            yield '[]'
+        else:
+            yield ']'
+
+
+class IdentityMap(object):
+    """
+    Maps user ids to already parsed users so repeated authors in a
+    payload share one instance. Pass it to ModelParser to share it
+    across parses. A user is only reused for JSON equal to what it was
+    parsed from, so newer counts or an embedded status are not lost.
+    The map is cleared once it holds size users (None for no limit).
+    """
+
+    def __init__(self, size=10000):
+        self.size = size
+        self._objects = {}
+
+    def get(self, key, json):
+        entry = self._objects.get(key)
+        if entry is not None and entry[0] == json:
+            return entry[1]
+        return None
+
+    def add(self, key, json, obj):
+        if self.size is not None and len(self._objects) >= self.size:
+            self._objects.clear()
+        self._objects[key] = (json, obj)
+
+
+class ColumnarResultSet(object):
+    """
+    Result set that keeps numeric fields, string fields and created_at
+    (as epoch seconds) of its items in NumPy arrays, so aggregations
+    over a page are vectorized. Indexing or iterating returns regular
+    model instances, which are parsed on first access.
+    """
+
+    def __init__(self, model, api, json_list, columns=None):
+        if numpy is None:
+            raise TweepError('ColumnarResultSet requires numpy')
+        self.model = model
+        self._api = api
+        self._json = json_list
+        self._rows = [None] * len(json_list)
+        if columns is None:
+            columns = self._build_columns()
+        self.columns = columns
+
+    def __getstate__(self):
+        # pickle, rows are parsed again after unpickling
+        return {'model': self.model, 'json': self._json,
+                'columns': self.columns}
+
+    def __setstate__(self, state):
+        # unpickle
+        self.__init__(state['model'], None, state['json'], state['columns'])
+
+    def _build_columns(self):
+        json_list = self._json
+        columns = {}
+        for name in self.model._numeric_columns:
+            columns[name] = numpy.array([obj.get(name) or 0 for obj in json_list],
+                                        dtype=numpy.int64)
+        for name in self.model._string_columns:
+            columns[name] = numpy.array([obj.get(name) or u'' for obj in json_list],
+                                        dtype=unicode)
+        created_at = []
+        for obj in json_list:
+            if obj.get('created_at'):
+                created_at.append(calendar.timegm(
+                        parse_datetime(obj['created_at']).timetuple()))
+            else:
+                created_at.append(0)
+        columns['created_at'] = numpy.array(created_at, dtype=numpy.int64)
+        return columns
+
+    def __getattr__(self, name):
+        # expose columns as attributes, e.g. results.followers_count
+        if name != 'columns' and name in self.__dict__.get('columns', ()):
+            return self.columns[name]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self._json)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(numpy.arange(len(self._json))[index])
+        row = self._rows[index]
+        if row is None:
+            row = self._rows[index] = self.model.parse(self._api, self._json[index])
+        return row
+
+    def __iter__(self):
+        for i in xrange(len(self._json)):
+            yield self[i]
+
+    def take(self, indices):
+        """Return a new result set holding the items at indices"""
+        columns = {}
+        for name, column in self.columns.items():
+            columns[name] = column[indices]
+        json_list = [self._json[i] for i in indices]
+        return ColumnarResultSet(self.model, self._api, json_list, columns)
+
+    def filter(self, mask):
+        """Return a new result set holding the items where mask is true"""
+        return self.take(numpy.nonzero(mask)[0])
+
+    def sorted_by(self, name, reverse=False):
+        """Return a new result set ordered by the column name"""
+        indices = numpy.argsort(self.columns[name], kind='mergesort')
+        if reverse:
+            indices = indices[::-1]
+        return self.take(indices)
+
+
+# identity map of the parse running in this thread, set by ModelParser
+_identity = threading.local()
+
+
+def _slot_names(cls, cache={}):
+    """Return the data slots declared by cls and its bases."""
+    names = cache.get(cls)
+    if names is None:
+        names = []
+        for klass in cls.__mro__:
+            for name in klass.__dict__.get('__slots__', ()):
+                if name not in ('_api', '__dict__', '__weakref__'):
+                    names.append(name)
+        cache[cls] = names
+    return names
+
 
 class Model(object):
 
+    # Subclasses may list the fields they expect in __slots__ (plus
+    # '__dict__' for any others) to avoid a per-instance dict.
+    __slots__ = ('_api',)
+
     def __init__(self, api=None):
         self._api = api
 
+    def _fields(self):
+        """Yield (name, value) of each field that is set"""
+        for name in _slot_names(type(self)):
+            try:
+                # bypass __getattr__ so lazy models are not materialized
+                yield name, object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        # the API reference is a slot, so it is never included
+        for item in getattr(self, '__dict__', {}).iteritems():
+            yield item
+
     def __getstate__(self):
-        # pickle
-        pickle = dict(self.__dict__)
-        try:
-            del pickle['_api']  # do not pickle the API reference
-        except KeyError:
-            pass
-        return pickle
+        # pickle, lazy models keep their unparsed fields
+        return dict(Model._fields(self))
+
+    def __setstate__(self, state):
+        # unpickle, the API reference is restored by the binder
+        # for top-level results only, nested models keep None
+        self._api = None
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    def to_dict(self, fields=None, datetime_format=ISO_FORMAT):
+        """
+        Return the fields of this model as a JSON-ready dict.
+        Nested models are converted too and dates are formatted
+        with datetime_format. fields limits the result to the
+        given attribute names.
+        """
+        result = {}
+        if fields is None:
+            for name, value in self._fields():
+                if name[0] != '_':
+                    result[name] = _to_json_value(value, datetime_format)
+        else:
+            for name in fields:
+                try:
+                    value = getattr(self, name)
+                except AttributeError:
+                    continue
+                result[name] = _to_json_value(value, datetime_format)
+        return result
+
+    def to_json(self, fields=None, datetime_format=ISO_FORMAT):
+        """Return this model as JSON text, see to_dict"""
+        return json_dumps(self.to_dict(fields, datetime_format))
 
     @classmethod
     def parse(cls, api, json):
@@ -41,28 +257,47 @@ class Model(object):
 
 class Status(Model):
 
+    # Known fields are slots; anything else Twitter sends goes to the
+    # instance dict, which is only allocated when first needed.
+    __slots__ = ('id', 'id_str', 'text', 'source', 'source_url', 'truncated',
+                 'created_at', 'author', 'in_reply_to_status_id',
+                 'in_reply_to_status_id_str', 'in_reply_to_user_id',
+                 'in_reply_to_user_id_str', 'in_reply_to_screen_name',
+                 'favorited', 'retweeted', 'retweet_count', 'retweeted_status',
+                 'geo', 'coordinates', 'place', 'contributors', 'entities',
+                 '__dict__')
+
+    def _get_user(self):
+        return self.author
+
+    def _set_user(self, user):
+        self.author = user
+
+    user = property(_get_user, _set_user)  # DEPRECIATED
+
     @classmethod
     def parse(cls, api, json):
         status = cls(api)
         for k, v in json.items():
-            if k == 'user':
-                user = User.parse(api, v)
-                setattr(status, 'author', user)
-                setattr(status, 'user', user)  # DEPRECIATED
-            elif k == 'created_at':
-                setattr(status, k, parse_datetime(v))
-            elif k == 'source':
-                if '<' in v:
-                    setattr(status, k, parse_html_value(v))
-                    setattr(status, 'source_url', parse_a_href(v))
-                else:
-                    setattr(status, k, v)
-            elif k == 'retweeted_status':
-                setattr(status, k, Status.parse(api, v))
-            else:
-                setattr(status, k, v)
+            status._parse_field(k, v)
         return status
 
+    def _parse_field(self, k, v):
+        if k == 'user':
+            setattr(self, 'author', self._user_model.parse(self._api, v))
+        elif k == 'created_at':
+            setattr(self, k, parse_datetime(v))
+        elif k == 'source':
+            if '<' in v:
+                setattr(self, k, parse_html_value(v))
+                setattr(self, 'source_url', parse_a_href(v))
+            else:
+                setattr(self, k, v)
+        elif k == 'retweeted_status':
+            setattr(self, k, type(self).parse(self._api, v))
+        else:
+            setattr(self, k, v)
+
     def destroy(self):
         return self._api.destroy_status(self.id)
 
@@ -78,24 +313,50 @@ class Status(Model):
 
 class User(Model):
 
+    __slots__ = ('id', 'id_str', 'name', 'screen_name', 'location',
+                 'description', 'url', 'protected', 'followers_count',
+                 'friends_count', 'listed_count', 'favourites_count',
+                 'statuses_count', 'created_at', 'utc_offset', 'time_zone',
+                 'geo_enabled', 'verified', 'lang', 'contributors_enabled',
+                 'profile_background_color', 'profile_background_image_url',
+                 'profile_background_tile', 'profile_image_url',
+                 'profile_link_color', 'profile_sidebar_border_color',
+                 'profile_sidebar_fill_color', 'profile_text_color',
+                 'profile_use_background_image', 'show_all_inline_media',
+                 'following', 'follow_request_sent', 'notifications', 'status',
+                 '__dict__')
+
     @classmethod
     def parse(cls, api, json):
+        users = getattr(_identity, 'map', None)
+        if users is not None:
+            key = (cls, json.get('id'))
+            user = users.get(key, json)
+            if user is not None:
+                return user
+
         user = cls(api)
         for k, v in json.items():
-            if k == 'created_at':
-                setattr(user, k, parse_datetime(v))
-            elif k == 'status':
-                setattr(user, k, Status.parse(api, v))
-            elif k == 'following':
-                # twitter sets this to null if it is false
-                if v is True:
-                    setattr(user, k, True)
-                else:
-                    setattr(user, k, False)
-            else:
-                setattr(user, k, v)
+            user._parse_field(k, v)
+
+        if users is not None and key[1] is not None:
+            users.add(key, json, user)
         return user
 
+    def _parse_field(self, k, v):
+        if k == 'created_at':
+            setattr(self, k, parse_datetime(v))
+        elif k == 'status':
+            setattr(self, k, self._status_model.parse(self._api, v))
+        elif k == 'following':
+            # twitter sets this to null if it is false
+            if v is True:
+                setattr(self, k, True)
+            else:
+                setattr(self, k, False)
+        else:
+            setattr(self, k, v)
+
     @classmethod
     def parse_list(cls, api, json_list):
         if isinstance(json_list, list):
@@ -138,6 +399,91 @@ class User(Model):
         return self._api.followers_ids(user_id=self.id, *args, **kargs)
 
 
+# models used for nested objects
+Status._user_model = User
+User._status_model = Status
+
+
+class LazyModel(object):
+    """
+    Mixin that keeps the decoded JSON object and converts each
+    field on first access instead of during parse.
+    """
+
+    __slots__ = ()
+
+    # attribute name -> JSON key it is parsed from, if they differ
+    _json_keys = {}
+
+    @classmethod
+    def parse(cls, api, json):
+        obj = cls(api)
+        obj._json = json
+        return obj
+
+    def __getattr__(self, name):
+        # only called for attributes that are not set yet
+        if name == '_json' or name.startswith('__'):
+            raise AttributeError(name)
+        key = self._json_keys.get(name, name)
+        try:
+            value = self._json[key]
+        except KeyError:
+            raise AttributeError(name)
+        self._parse_field(key, value)
+        return object.__getattribute__(self, name)
+
+    def _fields(self):
+        # materialize the fields not accessed yet
+        for key in self._json:
+            getattr(self, key, None)
+        return Model._fields(self)
+
+
+class LazyStatus(LazyModel, Status):
+
+    __slots__ = ('_json',)
+    _json_keys = {'author': 'user', 'source_url': 'source'}
+
+
+class LazyUser(LazyModel, User):
+
+    __slots__ = ('_json',)
+
+
+LazyStatus._user_model = LazyUser
+LazyUser._status_model = LazyStatus
+
+
+class ColumnarStatus(Status):
+    """Status whose lists are parsed into a ColumnarResultSet"""
+
+    __slots__ = ()
+    _numeric_columns = ('id', 'in_reply_to_status_id', 'in_reply_to_user_id')
+    _string_columns = ('text', 'in_reply_to_screen_name')
+
+    @classmethod
+    def parse_list(cls, api, json_list):
+        return ColumnarResultSet(cls, api, json_list)
+
+
+class ColumnarUser(User):
+    """User whose lists are parsed into a ColumnarResultSet"""
+
+    __slots__ = ()
+    _numeric_columns = ('id', 'followers_count', 'friends_count',
+                        'statuses_count', 'favourites_count', 'listed_count')
+    _string_columns = ('screen_name', 'name')
+
+    @classmethod
+    def parse_list(cls, api, json_list):
+        if isinstance(json_list, list):
+            item_list = json_list
+        else:
+            item_list = json_list['users']
+        return ColumnarResultSet(cls, api, item_list)
+
+
 class DirectMessage(Model):
 
     @classmethod
@@ -200,7 +546,7 @@ class SearchResult(Model):
             if k == 'created_at':
                 setattr(result, k, parse_search_datetime(v))
             elif k == 'source':
-                setattr(result, k, parse_html_value(unescape_html(v)))
+                setattr(result, k, parse_search_source(v))
             else:
                 setattr(result, k, v)
         return result
@@ -310,3 +656,17 @@ class ModelFactory(object):
     json = JSONModel
     ids = IDModel
 
+
+class LazyModelFactory(ModelFactory):
+    """Model factory whose statuses and users are parsed lazily"""
+
+    status = LazyStatus
+    user = LazyUser
+
+
+class ColumnarModelFactory(ModelFactory):
+    """Model factory that parses status and user lists into columns"""
+
+    status = ColumnarStatus
+    user = ColumnarUser
+
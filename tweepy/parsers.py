@@ -2,9 +2,13 @@
 # Copyright 2009-2010 Joshua Roesslein
 # See LICENSE for details.
 
-from tweepy.models import ModelFactory
+import re
+
+from tweepy.models import ModelFactory, IdentityMap, _identity
 from tweepy.utils import import_simplejson
 
+re_cursor = re.compile(r'"(previous_cursor|next_cursor)"\s*:\s*(-?\d+)')
+
 
 class Parser(object):
 
@@ -29,8 +33,10 @@ class JSONParser(Parser):
 
     payload_format = 'json'
 
-    def __init__(self):
-        self.json_lib = import_simplejson()
+    @property
+    def json_lib(self):
+        # the process-wide backend, see utils.set_json_backend
+        return import_simplejson()
 
     def parse(self, method, payload):
         try:
@@ -52,11 +58,31 @@ class JSONParser(Parser):
             return error['errors']
 
 
+class RawParser(JSONParser):
+    """Return the payload undecoded, with cursors if present"""
+
+    def parse(self, method, payload):
+        # cursors are read without decoding the whole payload
+        cursors = dict(re_cursor.findall(payload))
+        if 'previous_cursor' in cursors and 'next_cursor' in cursors:
+            return payload, (int(cursors['previous_cursor']),
+                    int(cursors['next_cursor']))
+        else:
+            return payload
+
+
 class ModelParser(JSONParser):
 
-    def __init__(self, model_factory=None):
-        JSONParser.__init__(self)
+    # payloads that are not objects keyed by field name
+    unprojected_types = ('json', 'ids', 'friendship')
+
+    def __init__(self, model_factory=None, identity_map=None):
+        """
+        identity_map: True to share repeated users within each payload,
+                      or an IdentityMap to share them across payloads.
+        """
         self.model_factory = model_factory or ModelFactory
+        self.identity_map = identity_map
 
     def parse(self, method, payload):
         try:
@@ -71,13 +97,35 @@ class ModelParser(JSONParser):
         else:
             cursors = None
 
-        if method.payload_list:
-            result = model.parse_list(method.api, json)
-        else:
-            result = model.parse(method.api, json)
+        fields = getattr(method, 'fields', None)
+        if fields and method.payload_type not in self.unprojected_types:
+            json = self.project(json, fields)
+
+        if self.identity_map is True:
+            _identity.map = IdentityMap()
+        elif self.identity_map:
+            _identity.map = self.identity_map
+        try:
+            if method.payload_list:
+                result = model.parse_list(method.api, json)
+            else:
+                result = model.parse(method.api, json)
+        finally:
+            _identity.map = None
 
         if cursors:
             return result, cursors
         else:
             return result
 
+    def project(self, json, fields):
+        """Keep only the given keys of each object in the payload"""
+        if isinstance(json, list):
+            return [self.project(obj, fields) for obj in json]
+        for container in ('users', 'results', 'lists'):
+            if isinstance(json.get(container), list):
+                json = dict(json)
+                json[container] = self.project(json[container], fields)
+                return json
+        return dict((k, json[k]) for k in fields if k in json)
+
@@ -13,8 +13,7 @@ from tweepy.models import Status
 from tweepy.api import API
 from tweepy.error import TweepError
 
-from tweepy.utils import import_simplejson
-json = import_simplejson()
+from tweepy.utils import json_loads
 
 STREAM_VERSION = 1
 
@@ -32,15 +31,15 @@ class StreamListener(object):
         """
 
         if 'in_reply_to_status_id' in data:
-            status = Status.parse(self.api, json.loads(data))
+            status = Status.parse(self.api, json_loads(data))
             if self.on_status(status) is False:
                 return False
         elif 'delete' in data:
-            delete = json.loads(data)['delete']['status']
+            delete = json_loads(data)['delete']['status']
             if self.on_delete(delete['id'], delete['user_id']) is False:
                 return False
         elif 'limit' in data:
-            if self.on_limit(json.loads(data)['limit']['track']) is False:
+            if self.on_limit(json_loads(data)['limit']['track']) is False:
                 return False
 
     def on_status(self, status):
@@ -3,24 +3,69 @@
 # See LICENSE for details.
 
 from datetime import datetime
-import time
 import htmlentitydefs
 import re
-import locale
 
 
-def parse_datetime(string):
-    # Set locale for date parsing
-    locale.setlocale(locale.LC_TIME, 'C')
+# Twitter always formats dates with English names in UTC, so they are
+# parsed with fixed tables instead of time.strptime, which depends on
+# the process-wide (and thread-unsafe) locale.
+_months = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+           'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+_weekdays = {'Mon': 0, 'Tue': 1, 'Wed': 2, 'Thu': 3, 'Fri': 4, 'Sat': 5, 'Sun': 6}
+
+# recently parsed strings, timelines repeat the same timestamps a lot
+_datetime_memo = {}
+_datetime_memo_size = 4096
 
-    # We must parse datetime this way to work in python 2.4
-    date = datetime(*(time.strptime(string, '%a %b %d %H:%M:%S +0000 %Y')[0:6]))
 
-    # Reset locale back to the default setting
-    locale.setlocale(locale.LC_TIME, '')
+def _build_datetime(string, weekday, day, month, year, clock, zone):
+    try:
+        hour, minute, second = clock.split(':')
+        date = datetime(int(year), _months[month], int(day),
+                        int(hour), int(minute), int(second))
+    except (KeyError, ValueError):
+        raise ValueError('time data %r does not match Twitter format' % string)
+    if weekday not in _weekdays or zone != '+0000':
+        raise ValueError('time data %r does not match Twitter format' % string)
+    if len(_datetime_memo) >= _datetime_memo_size:
+        _datetime_memo.clear()
+    _datetime_memo[string] = date
     return date
 
 
+def parse_datetime(string):
+    """Parse a date like 'Wed Aug 27 13:08:45 +0000 2008'"""
+    date = _datetime_memo.get(string)
+    if date is not None:
+        return date
+    try:
+        weekday, month, day, clock, zone, year = string.split(' ')
+    except ValueError:
+        raise ValueError('time data %r does not match Twitter format' % string)
+    return _build_datetime(string, weekday, day, month, year, clock, zone)
+
+
+# recently formatted dates, keyed by (date, format)
+_format_memo = {}
+
+
+def format_datetime(date, format='%Y-%m-%dT%H:%M:%SZ'):
+    """Format a parsed date, as ISO 8601 in UTC by default"""
+    key = (date, format)
+    string = _format_memo.get(key)
+    if string is None:
+        if len(_format_memo) >= _datetime_memo_size:
+            _format_memo.clear()
+        string = _format_memo[key] = date.strftime(format)
+    return string
+
+
+def parse_datetimes(strings):
+    """Parse a list of dates in parse_datetime format"""
+    return [parse_datetime(string) for string in strings]
+
+
 def parse_html_value(html):
 
     return html[html.find('>')+1:html.rfind('<')]
@@ -34,38 +79,74 @@ def parse_a_href(atag):
 
 
 def parse_search_datetime(string):
-    # Set locale for date parsing
-    locale.setlocale(locale.LC_TIME, 'C')
+    """Parse a date like 'Wed, 27 Aug 2008 13:08:45 +0000'"""
+    date = _datetime_memo.get(string)
+    if date is not None:
+        return date
+    try:
+        weekday, day, month, year, clock, zone = string.split(' ')
+    except ValueError:
+        raise ValueError('time data %r does not match Twitter format' % string)
+    return _build_datetime(string, weekday.rstrip(','), day, month, year,
+                           clock, zone)
 
-    # We must parse datetime this way to work in python 2.4
-    date = datetime(*(time.strptime(string, '%a, %d %b %Y %H:%M:%S +0000')[0:6]))
 
-    # Reset locale back to the default setting
-    locale.setlocale(locale.LC_TIME, '')
-    return date
+def parse_search_datetimes(strings):
+    """Parse a list of dates in parse_search_datetime format"""
+    return [parse_search_datetime(string) for string in strings]
+
+
+re_entity = re.compile("&#?\w+;")
+
+# named entities and the character references seen so far
+_entities = dict(('&%s;' % name, unichr(code))
+                 for name, code in htmlentitydefs.name2codepoint.items())
+_entities_size = len(_entities) + 1024
+
+
+def _unescape_entity(m):
+    text = m.group(0)
+    char = _entities.get(text)
+    if char is not None:
+        return char
+    if text[:2] == "&#":
+        # character reference
+        try:
+            if text[:3] == "&#x":
+                char = unichr(int(text[3:-1], 16))
+            else:
+                char = unichr(int(text[2:-1]))
+        except ValueError:
+            return text # leave as is
+        if len(_entities) < _entities_size:
+            _entities[text] = char
+        return char
+    return text # leave as is
 
 
 def unescape_html(text):
-    """Created by Fredrik Lundh (http://effbot.org/zone/re-sub.htm#unescape-html)"""
-    def fixup(m):
-        text = m.group(0)
-        if text[:2] == "&#":
-            # character reference
-            try:
-                if text[:3] == "&#x":
-                    return unichr(int(text[3:-1], 16))
-                else:
-                    return unichr(int(text[2:-1]))
-            except ValueError:
-                pass
-        else:
-            # named entity
-            try:
-                text = unichr(htmlentitydefs.name2codepoint[text[1:-1]])
-            except KeyError:
-                pass
-        return text # leave as is
-    return re.sub("&#?\w+;", fixup, text)
+    """Based on Fredrik Lundh's (http://effbot.org/zone/re-sub.htm#unescape-html)"""
+    if '&' not in text:
+        return text
+    return re_entity.sub(_unescape_entity, text)
+
+
+# decoded search result sources, a few clients post most results
+_source_memo = {}
+_source_memo_size = 1024
+
+
+def parse_search_source(source):
+    """Return the client name from a search result's escaped source link"""
+    name = _source_memo.get(source)
+    if name is None:
+        name = unescape_html(source)
+        if '<' in name:
+            name = parse_html_value(name)
+        if len(_source_memo) >= _source_memo_size:
+            _source_memo.clear()
+        _source_memo[source] = name
+    return name
 
 
 def convert_to_utf8_str(arg):
@@ -78,19 +159,43 @@ def convert_to_utf8_str(arg):
 
 
 
+# JSON libraries to try, fastest decoder first
+json_backends = [
+    'ujson',
+    'simplejson',
+    'json',  # Python 2.6+
+    'django.utils.simplejson',  # Google App Engine
+]
+_json_backend = None
+
+def set_json_backend(backend):
+    """
+    Use backend for all JSON in this process.
+    backend is a module providing loads and dumps, or its name.
+    """
+    global _json_backend
+    if isinstance(backend, basestring):
+        backend = __import__(backend, {}, {}, ['loads'])
+    _json_backend = backend
+
 def import_simplejson():
-    try:
-        import simplejson as json
-    except ImportError:
-        try:
-            import json  # Python 2.6+
-        except ImportError:
+    if _json_backend is None:
+        for name in json_backends:
             try:
-                from django.utils import simplejson as json  # Google App Engine
+                set_json_backend(name)
+                break
             except ImportError:
-                raise ImportError, "Can't load a json library"
+                pass
+        else:
+            raise ImportError, "Can't load a json library"
+
+    return _json_backend
+
+def json_loads(data):
+    return import_simplejson().loads(data)
 
-    return json
+def json_dumps(obj):
+    return import_simplejson().dumps(obj)
 
 def list_to_csv(item_list):
     if item_list: